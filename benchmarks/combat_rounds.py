@@ -0,0 +1,48 @@
+# Times CombatResolver.resolve at 1k, 10k and 50k engagements (each one retaliated, so twice as many attacks),
+# with NumPy (when installed) and in pure Python
+# Run from the repository root: python benchmarks/combat_rounds.py
+from pathlib import Path
+import sys
+import timeit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from combat import CombatResolver
+from vitals import VitalsEngine, numpy
+from world import World
+
+
+class Fighter:
+    def __init__(self, name, location, level):
+        self.id = self.name = name
+        self.location = location
+        self._level = level
+        self._hp = 0
+        self.vitals_slot = None
+
+
+repeat = 10
+w = World()
+
+for use_numpy in (True, False):
+    if use_numpy and numpy is None:
+        print('numpy   not installed')
+        continue
+
+    for count in (1000, 10000, 50000):
+        w.vitals = VitalsEngine(capacity=2 * count, use_numpy=use_numpy)
+        w.combat = CombatResolver(w, use_numpy=use_numpy)
+        for i in range(count):
+            attacker = Fighter(f'a{i}', f'bench:r{i}', 5 + i % 20)
+            defender = Fighter(f'd{i}', f'bench:r{i}', 5 + i % 23)
+            w.vitals.register(attacker)
+            w.vitals.register(defender)
+            w.combat.engage(attacker, defender)
+
+        # Everyone starts each round at full hp so nobody dies and the number of fights stays constant
+        def reset():
+            for slot in range(2 * count):
+                w.vitals.columns['hp'][slot] = w.vitals.columns['max_hp'][slot]
+
+        elapsed = sum(timeit.repeat(w.combat.resolve, setup=reset, number=1, repeat=repeat)) / repeat
+        print(f'{"numpy" if use_numpy else "python" : <7} {count // 1000 : >3}k: {elapsed * 1000 : >6.1f} ms/round ({1 / elapsed : >5.1f} rounds/s)')
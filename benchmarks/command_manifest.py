@@ -0,0 +1,31 @@
+# Times building the command manifest cold (every module parsed) and from its cache, and a registry lookup
+# Run from the repository root: python benchmarks/command_manifest.py
+from pathlib import Path
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import commands.commands as registry
+
+
+repeat = 200
+
+# Use a scratch manifest so the real cache is left alone
+registry.manifest_path = Path(tempfile.mkdtemp()) / 'manifest.json'
+
+
+def cold():
+    registry.manifest_path.unlink(missing_ok=True)
+    registry.build_manifest()
+
+
+cold_time = timeit.timeit(cold, number=repeat)
+cached_time = timeit.timeit(registry.build_manifest, number=repeat)
+print(f'manifest cold:   {cold_time / repeat * 1000 : >6.2f} ms')
+print(f'manifest cached: {cached_time / repeat * 1000 : >6.2f} ms')
+
+commands = registry.register_commands()
+lookup = timeit.timeit(lambda: commands.get('look'), number=repeat * 1000)
+print(f'{len(commands.commands)} verbs, lookup: {lookup / (repeat * 1000) * 1e9 : >6.0f} ns')
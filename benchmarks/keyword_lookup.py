@@ -0,0 +1,55 @@
+# Finds targets in a room of 500 denizens through the keyword index and by a linear scan, both for a rare keyword
+# and for one that nearly everyone shares with the speaker, and times leaving and re-entering the room
+# Run from the repository root: python benchmarks/keyword_lookup.py [occupants]
+from pathlib import Path
+import sys
+import timeit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from world import Room
+
+
+class Occupant:
+    def __init__(self, i, keywords):
+        self.id = self.name = f'Occupant{i}'
+        self.keywords = keywords
+
+
+def scan(room, keyword, ordinal, exclude=None):
+    # How targets were found before the index: every occupant's keywords, checked in order
+    for character in room.characters:
+        if character is not exclude and any(candidate.lower().startswith(keyword) for candidate in character.keywords):
+            ordinal -= 1
+            if not ordinal:
+                return character
+
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+repeat = 10000
+
+room = Room('bench', 'hall', name='Hall', desc='A crowded hall.')
+occupants = []
+for i in range(count):
+    # The captains arrive last, so a scan has to pass nearly everyone else first
+    keywords = ['captain', 'xavier'] if i >= count - 5 else ['guard', f'soldier{i}', 'palace']
+    occupants.append(Occupant(i, keywords))
+    room.add_character(occupants[-1])
+
+# The speaker is a guard too, either the first to arrive (so every ordinal steps over them) or the last
+cases = [
+    ('third "capt"', 'capt', 3, None),
+    ('third "guard", first guard speaking', 'guard', 3, occupants[0]),
+    ('third "guard", last guard speaking', 'guard', 3, occupants[count - 6]),
+    ('400th "gu", first guard speaking', 'gu', 400, occupants[0]),
+]
+for label, keyword, ordinal, speaker in cases:
+    assert room.find_character(keyword, ordinal, exclude=speaker) is scan(room, keyword, ordinal, speaker)
+    indexed = timeit.timeit(lambda: room.find_character(keyword, ordinal, exclude=speaker), number=repeat)
+    scanned = timeit.timeit(lambda: scan(room, keyword, ordinal, speaker), number=repeat // 10)
+    print(f'{count} occupants, {label : <37} index {indexed / repeat * 1e6 : >6.2f} us  scan {scanned / (repeat // 10) * 1e6 : >7.1f} us')
+
+# Each round trip sends the occupant to the back of every list they are in, the worst place for a list removal
+leaving = occupants[0]
+moved = timeit.timeit(lambda: (room.remove_character(leaving), room.add_character(leaving)), number=repeat)
+print(f'leave and re-enter (keeping the index current): {moved / repeat * 1e6 : >6.2f} us')
@@ -0,0 +1,26 @@
+# Compares websocket frame sizes and encode time for each subprotocol, before permessage-deflate
+# Run from the repository root: python benchmarks/protocol_encoding.py
+from pathlib import Path
+import sys
+import timeit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import protocol
+
+
+messages = [
+    ('game', ['{bold}', 'Welcome to ', '{cyan}', 'sigma2-mud', '{reset}', '!', '\r\n', '\r\n']),
+    ('prompt', ['Enter your name (or + to create a new character): ']),
+    ('state', {'state': 'welcome', 'mask': '^((\\+)|([A-Z][A-Z,a-z]*)|(resume [A-Za-z0-9_.-]+))$'}),
+    ('state', {'state': 'password', 'mask': ''}),
+    ('game', ['{bold}', '{cyan}', 'Palace - Courtyard', '{reset}', '\r\n', 'You are standing in a courtyard outside a royal palace.', '\r\n', '{green}', 'Exits: ', 'north (closed), south, east, west', '{reset}', '\r\n']),
+    ('prompt', ['> ']),
+]
+
+repeat = 20000
+
+for subprotocol in (protocol.JSON, protocol.BINARY, protocol.BINARY_DICT):
+    size = sum(len(protocol.encode(subprotocol, context, content)) for context, content in messages)
+    elapsed = timeit.timeit(lambda: [protocol.encode(subprotocol, context, content) for context, content in messages], number=repeat)
+    print(f'{subprotocol : <18} {size : >5} bytes  {elapsed / repeat / len(messages) * 1e6 : >5.2f} us/msg')
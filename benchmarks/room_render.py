@@ -0,0 +1,42 @@
+# Times a cached look in a room with 20 denizens, and a look right after its occupancy changed
+# Run from the repository root: python benchmarks/room_render.py
+from pathlib import Path
+import sys
+import timeit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from network import TelnetConnection, WebsocketConnection
+from render import RenderCache
+from world import Room, World
+
+
+class Occupant:
+    def __init__(self, i):
+        self.id = self.name = f'Guard{i}'
+        self.keywords = ['guard', f'guard{i}']
+        self.short = f'A palace guard (number {i}) stands at attention here.'
+
+
+repeat = 20000
+cache = RenderCache(World())
+room = Room('bench', 'hall', name='Palace - Hall', desc='A long hall lined with banners and suits of armor. ' * 4)
+occupants = [Occupant(i) for i in range(20)]
+for occupant in occupants:
+    room.add_character(occupant)
+viewer = occupants[0]
+
+for connection in (TelnetConnection, WebsocketConnection):
+    cache.render(room, connection, viewer)
+    cached = timeit.timeit(lambda: cache.render(room, connection, viewer), number=repeat)
+
+    # Bumping the version is what any arrival, departure or door change does
+    def changed():
+        room.version += 1
+        cache.render(room, connection, viewer)
+
+    rebuilt = timeit.timeit(changed, number=repeat)
+    print(f'{connection.render_protocol : <7} cached: {cached / repeat * 1e6 : >5.1f} us  after a change: {rebuilt / repeat * 1e6 : >5.1f} us')
+
+stats = cache.stats()
+print(f'hit rate {stats["hit_rate"]:.0%}, {stats["entries"]} entries, {stats["bytes"]} bytes')
@@ -0,0 +1,42 @@
+# Times one vitals tick over many registered characters, with NumPy (when installed) and in pure Python
+# Run from the repository root: python benchmarks/vitals_tick.py [characters]
+from pathlib import Path
+import sys
+import timeit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from vitals import HP_PER_LEVEL, VitalsEngine, numpy
+
+
+class Subject:
+    def __init__(self, level):
+        self._level = level
+        self._hp = level * HP_PER_LEVEL
+        self.vitals_slot = None
+
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+repeat = 50
+
+for use_numpy in (True, False):
+    if use_numpy and numpy is None:
+        print('numpy   not installed')
+        continue
+
+    engine = VitalsEngine(use_numpy=use_numpy)
+    subjects = [Subject(1 + i % 50) for i in range(count)]
+    for i, subject in enumerate(subjects):
+        engine.register(subject)
+        if i % 7 == 0:
+            engine.set_timer(subject, 'poisoned', 1000)
+        elif i % 11 == 0:
+            engine.set_timer(subject, 'stunned', 1000)
+
+    # Put everyone back at half hp before each timed tick, so every tick does the full amount of work
+    def reset():
+        for slot in range(count):
+            engine.columns['hp'][slot] = engine.columns['max_hp'][slot] // 2
+
+    elapsed = sum(timeit.repeat(engine.tick, setup=reset, number=1, repeat=repeat))
+    print(f'{"numpy" if use_numpy else "python" : <7} {count} characters: {elapsed / repeat * 1000 : >6.1f} ms/tick')
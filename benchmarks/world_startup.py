@@ -0,0 +1,76 @@
+# Generates a synthetic world, compiles it, and times World.setup from the YAML area files and from world.compiled
+# Run from the repository root: python benchmarks/world_startup.py [areas] [rooms per area]
+from contextlib import redirect_stdout
+from pathlib import Path
+import io
+import sys
+import tempfile
+import time
+
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import compiler
+from world import World
+
+
+def generate(root, area_count, room_count):
+    # Each area is a corridor of rooms linked east-west, with its first room linked north-south to its neighbours
+    # and a trapdoor (one-way, behind a door) every ten rooms
+    (root / 'areas').mkdir(parents=True)
+    for a in range(area_count):
+        rooms, doors = {}, {}
+        for i in range(room_count):
+            exits = {}
+            if i + 1 < room_count:
+                exits['e'] = f'r{i + 1}'
+            if i > 0:
+                exits['w'] = f'r{i - 1}'
+            if i == 0 and a > 0:
+                exits['s'] = f'a{a - 1}:r0'
+            if i == 0 and a + 1 < area_count:
+                exits['n'] = f'a{a + 1}:r0'
+            if i % 10 == 5 and i + 1 < room_count:
+                exits['d'] = {'target': f'r{i + 1}', 'door': f'd{i}'}
+                doors[f'd{i}'] = {'closed': True}
+            rooms[f'r{i}'] = {'name': f'Room {a}-{i}', 'desc': 'A long description of a nondescript place.  ' * 4, 'exits': exits}
+        with (root / 'areas' / f'a{a}.yaml').open('w') as f:
+            yaml.safe_dump({'name': f'Area {a}', 'rooms': rooms, 'doors': doors}, f)
+    (root / 'config.yaml').write_text('config:\n  default_location: a0:r0\n')
+
+
+def timed_setup(root):
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        World().setup(root)
+        return time.perf_counter() - start
+
+
+area_count = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+room_count = int(sys.argv[2]) if len(sys.argv) > 2 else 250
+repeat = 3
+
+root = Path(tempfile.mkdtemp()) / 'server'
+generate(root, area_count, room_count)
+
+with redirect_stdout(io.StringIO()):
+    start = time.perf_counter()
+    assert compiler.compile_world(root) == 0
+    compile_time = time.perf_counter() - start
+
+compiled_file = root / 'world.compiled'
+aside = root / 'world.compiled.aside'
+compiled_size = compiled_file.stat().st_size
+yaml_size = sum(area_file.stat().st_size for area_file in (root / 'areas').glob('*.yaml'))
+
+yaml_times, compiled_times = [], []
+for _ in range(repeat):
+    compiled_file.rename(aside)
+    yaml_times.append(timed_setup(root))
+    aside.rename(compiled_file)
+    compiled_times.append(timed_setup(root))
+
+print(f'{area_count * room_count} rooms in {area_count} areas: {yaml_size / 1e6:.1f} MB of YAML, {compiled_size / 1e6:.1f} MB compiled in {compile_time:.2f}s')
+print(f'setup from YAML:     {min(yaml_times) * 1000 : >7.0f} ms (best of {repeat})')
+print(f'setup from compiled: {min(compiled_times) * 1000 : >7.0f} ms (best of {repeat})')
@@ -1,4 +1,6 @@
-import uuid
+from uuid import uuid4
+
+from vitals import HP_PER_LEVEL
 
 
 class Character:
@@ -7,24 +9,49 @@ class Character:
         
         from world import World
         self.location = location or World().config['default_location']
+
+        # While registered with the vitals engine, the engine holds the authoritative values
+        self.vitals_slot = None
         
         self.load_stats(stats)
 
     def load_stats(self, stats):
         self.level = stats.get('level', 1)
-        self.hp = stats.get('hp', self.level * 15)
+        self.hp = stats.get('hp', self.level * HP_PER_LEVEL)
 
     id = property(lambda self: None)
 
+    def _get_hp(self):
+        if self.vitals_slot is not None:
+            from world import World
+            self._hp = World().vitals.get(self.vitals_slot, 'hp')
+        return self._hp
+
+    def _set_hp(self, hp):
+        self._hp = hp
+        if self.vitals_slot is not None:
+            from world import World
+            World().vitals.set(self.vitals_slot, 'hp', hp)
+
+    def _set_level(self, level):
+        self._level = level
+        if self.vitals_slot is not None:
+            from world import World
+            World().vitals.set_level(self.vitals_slot, level)
+
+    hp = property(_get_hp, _set_hp)
+    level = property(lambda self: self._level, _set_level)
+    max_hp = property(lambda self: self._level * HP_PER_LEVEL)
+
 
 class Denizen(Character):
-    def __init__(self, area_id, source_id, name, location, stats={}, keywords=[], short=None, desc=None):
+    def __init__(self, area_id, source_id, name, location, stats={}, keywords=[], short=None, desc=None, uuid=None):
         super().__init__(name, location, stats)
 
         self.area_id = area_id
         self.source_id = source_id
 
-        self.uuid = str(uuid.uuid4())
+        self.uuid = uuid or str(uuid4())
 
         self.keywords = keywords
         self.short = short or name
@@ -32,6 +59,32 @@ class Denizen(Character):
 
     id = property(lambda self: f'{self.source_id}@{self.uuid}')
 
+    # Once spawned (spawning marks it dirty itself), any change to a denizen's vitals belongs in the next checkpoint
+    def _set_hp(self, hp):
+        Character._set_hp(self, hp)
+        if self.vitals_slot is not None:
+            from world import World
+            World().checkpointer.mark_dirty(self)
+
+    def _set_level(self, level):
+        Character._set_level(self, level)
+        if self.vitals_slot is not None:
+            from world import World
+            World().checkpointer.mark_dirty(self)
+
+    hp = property(Character._get_hp, _set_hp)
+    level = property(lambda self: self._level, _set_level)
+    checkpoint_key = property(lambda self: ('denizen', self.id))
+
+    def to_proto(self):
+        return {
+            'location': self.location,
+            'stats': {
+                'level': self.level,
+                'hp': self.hp,
+            },
+        }
+
 
 class Player(Character):
     def __init__(self, connection, name, location=None, stats={}):
@@ -39,6 +92,9 @@ class Player(Character):
 
         self.connection = connection
 
+        # Structured status fields as last sent to the client, so only changes go out each tick
+        self.sent_status = {}
+
     def to_proto(self):
         return {
             'location': self.location,
@@ -49,6 +105,29 @@ class Player(Character):
         }
 
     id = property(lambda self: self.name)
+    keywords = property(lambda self: [self.name.lower()])
 
     def send_line(self, line):
         self.connection.write_line(line)
+
+    def send_room(self):
+        from world import World
+        self.connection.write_encoded(World().render_cache.render(World().rooms[self.location], self.connection, viewer=self))
+
+    def status(self):
+        from world import World
+        room = World().rooms.get(self.location)
+        return {
+            'name': self.name,
+            'level': self.level,
+            'hp': self.hp,
+            'max_hp': self.max_hp,
+            'location': self.location,
+            'room': room.name if room else None,
+        }
+
+    def flush_status(self):
+        changed = {field: value for field, value in self.status().items() if field not in self.sent_status or self.sent_status[field] != value}
+        if changed:
+            self.sent_status.update(changed)
+            self.connection.write_data('Char.Status', changed)
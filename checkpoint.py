@@ -0,0 +1,137 @@
+import json
+import sqlite3
+import time
+
+from common import log
+
+
+class Checkpointer:
+    def __init__(self, world):
+        self.world = world
+
+        # Objects changed since they were last written, keyed by (kind, id); None marks a removal
+        self.dirty = {}
+
+        # What the running checkpoint still has to write, taken from dirty when it started so later changes wait for the next one
+        self.pending = {}
+
+        self.current = None
+        self.last_started = time.time()
+
+    def create_tables(self, con):
+        cur = con.cursor()
+        cur.execute('CREATE TABLE IF NOT EXISTS checkpoints (id integer primary key, started real)')
+        cur.execute('CREATE TABLE IF NOT EXISTS checkpoint_doors (door_id text primary key, closed integer, locked integer, checkpoint integer)')
+        cur.execute('CREATE TABLE IF NOT EXISTS checkpoint_denizens (denizen_id text primary key, source_id text, data text, checkpoint integer)')
+        con.commit()
+
+    def mark_dirty(self, obj):
+        self.dirty[obj.checkpoint_key] = obj
+
+    def mark_removed(self, obj):
+        self.dirty[obj.checkpoint_key] = None
+
+    def step(self):
+        # Called every tick; writes at most one bounded batch so a large backlog never stalls the loop
+        if self.current is None:
+            if not self.dirty or time.time() - self.last_started < self.world.config['checkpoint_interval']:
+                return
+            self.start()
+
+        batch = []
+        for key in list(self.pending)[:self.world.config['checkpoint_batch_size']]:
+            batch.append((key, self.pending.pop(key)))
+
+        try:
+            self.write(batch)
+        except sqlite3.Error:
+            # Keep the batch for the next tick rather than losing it, then let the caller log the error
+            self.pending.update(batch)
+            raise
+
+        if not self.pending:
+            log(f'Checkpoint {self.current} complete after {time.time() - self.last_started:.1f}s', 'CHECKPOINT', trivial=True)
+            self.current = None
+
+    def flush(self):
+        # Writes everything outstanding in one go, for when the process is about to be replaced
+        if self.current is None:
+            if not self.dirty:
+                return
+            self.start()
+
+        self.pending.update(self.dirty)
+        self.dirty = {}
+        self.write(list(self.pending.items()))
+        self.pending = {}
+        log(f'Checkpoint {self.current} flushed', 'CHECKPOINT', trivial=True)
+        self.current = None
+
+    def write(self, batch):
+        con = self.world.database_connection()
+        try:
+            cur = con.cursor()
+            for (kind, id), obj in batch:
+                if kind == 'door':
+                    cur.execute('''
+                        INSERT INTO checkpoint_doors (door_id, closed, locked, checkpoint) VALUES (?, ?, ?, ?)
+                        ON CONFLICT (door_id) DO UPDATE SET closed=excluded.closed, locked=excluded.locked, checkpoint=excluded.checkpoint
+                    ''', (id, obj.closed, obj.locked, self.current))
+                elif kind == 'denizen' and obj is None:
+                    cur.execute('DELETE FROM checkpoint_denizens WHERE denizen_id = ?', (id, ))
+                elif kind == 'denizen':
+                    cur.execute('''
+                        INSERT INTO checkpoint_denizens (denizen_id, source_id, data, checkpoint) VALUES (?, ?, ?, ?)
+                        ON CONFLICT (denizen_id) DO UPDATE SET data=excluded.data, checkpoint=excluded.checkpoint
+                    ''', (id, f'{obj.area_id}:{obj.source_id}', json.dumps(obj.to_proto()), self.current))
+
+            con.commit()
+        finally:
+            con.close()
+
+    def start(self):
+        started = time.time()
+
+        con = self.world.database_connection()
+        try:
+            cur = con.cursor()
+            self.current = cur.execute('INSERT INTO checkpoints (started) VALUES (?)', (started, )).lastrowid
+
+            # Only the running checkpoint's row is worth keeping; rows carry their own checkpoint id for reference
+            cur.execute('DELETE FROM checkpoints WHERE id < ?', (self.current, ))
+            con.commit()
+        finally:
+            con.close()
+
+        self.last_started = started
+        self.pending, self.dirty = self.dirty, {}
+
+    def restore(self):
+        # Every row holds the most recently written state of its object, so applying them all yields the latest
+        # checkpoint, plus whatever an interrupted one had already written on top of it
+        con = self.world.database_connection()
+        cur = con.cursor()
+
+        doors = 0
+        for door_id, closed, locked in cur.execute('SELECT door_id, closed, locked FROM checkpoint_doors'):
+            door = self.world.doors.get(door_id)
+            if door:
+                door.closed = bool(closed)
+                door.locked = bool(locked)
+                doors += 1
+
+        denizens = 0
+        for denizen_id, source_id, data in cur.execute('SELECT denizen_id, source_id, data FROM checkpoint_denizens').fetchall():
+            if source_id not in self.world.denizen_sources:
+                log(f'Dropping checkpointed denizen <{denizen_id}>: source <{source_id}> no longer exists', 'CHECKPOINT')
+                cur.execute('DELETE FROM checkpoint_denizens WHERE denizen_id = ?', (denizen_id, ))
+                continue
+            self.world.spawn_denizen(source_id, uuid=denizen_id.split('@', 1)[1], **json.loads(data))
+            denizens += 1
+
+        con.commit()
+        con.close()
+
+        # Restoring went through the usual setters, but none of it needs writing back
+        self.dirty = {}
+        log(f'Restored {doors} doors and {denizens} denizens from checkpoint', 'CHECKPOINT')
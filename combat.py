@@ -0,0 +1,132 @@
+import random
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from common import log
+
+
+MAX_LEVEL_GAP = 10
+
+# Shared lookup tables: hit chance by (attacker level - defender level), clamped to +/- MAX_LEVEL_GAP,
+# and damage range by attacker level (levels past the end of the table use its last entry)
+hit_chances = [min(0.95, max(0.05, 0.6 + 0.03 * gap)) for gap in range(-MAX_LEVEL_GAP, MAX_LEVEL_GAP + 1)]
+damage_ranges = [(1 + level // 2, 4 + level) for level in range(101)]
+
+
+class CombatResolver:
+    def __init__(self, world, use_numpy=True):
+        self.world = world
+        self.use_numpy = use_numpy and numpy is not None
+
+        # Each attacker fights one defender at a time; engagements persist across rounds until broken
+        self.engagements = {}
+
+        if self.use_numpy:
+            self.rng = numpy.random.default_rng()
+            self.hit_table = numpy.array(hit_chances)
+            self.damage_min = numpy.array([low for low, high in damage_ranges])
+            self.damage_max = numpy.array([high for low, high in damage_ranges])
+
+    def engage(self, attacker, defender):
+        self.engagements[attacker] = defender
+
+        # Defenders fight back unless they are already busy with someone else
+        if defender not in self.engagements:
+            self.engagements[defender] = attacker
+
+    def resolve(self):
+        # Fights only continue between live, registered characters still sharing a room
+        pairs, attacker_slots, defender_slots = [], [], []
+        for attacker, defender in self.engagements.items():
+            attacker_slot, defender_slot = attacker.vitals_slot, defender.vitals_slot
+            if attacker_slot is not None and defender_slot is not None and attacker.location == defender.location:
+                pairs.append((attacker, defender))
+                attacker_slots.append(attacker_slot)
+                defender_slots.append(defender_slot)
+        self.engagements = dict(pairs)
+        if not pairs:
+            return
+
+        if self.use_numpy:
+            damage, dead_slots = self.roll_numpy(attacker_slots, defender_slots)
+            damage = damage.tolist()
+        else:
+            damage, dead_slots = self.roll_python(attacker_slots, defender_slots)
+
+        # Damage went straight into the hp column, so wounded denizens have to be queued for the checkpoint here
+        for (attacker, defender), amount in zip(pairs, damage):
+            if amount and defender.id in self.world.denizens:
+                self.world.checkpointer.mark_dirty(defender)
+
+        self.report(pairs, damage)
+
+        for slot in dead_slots:
+            self.kill(self.world.vitals.characters[slot])
+
+    def roll_numpy(self, attacker_slots, defender_slots):
+        attacker_slots = numpy.array(attacker_slots)
+        defender_slots = numpy.array(defender_slots)
+        columns = self.world.vitals.columns
+
+        attacker_levels = numpy.minimum(columns['level'][attacker_slots], len(damage_ranges) - 1)
+        gaps = numpy.clip(attacker_levels - columns['level'][defender_slots], -MAX_LEVEL_GAP, MAX_LEVEL_GAP)
+
+        hits = self.rng.random(len(attacker_slots)) < self.hit_table[gaps + MAX_LEVEL_GAP]
+        damage = self.rng.integers(self.damage_min[attacker_levels], self.damage_max[attacker_levels] + 1) * hits
+
+        # Several attackers may share a defender, so accumulate rather than assign
+        numpy.subtract.at(columns['hp'], defender_slots, damage)
+        numpy.maximum(columns['hp'], 0, out=columns['hp'])
+        return damage, numpy.unique(defender_slots[columns['hp'][defender_slots] == 0]).tolist()
+
+    def roll_python(self, attacker_slots, defender_slots):
+        columns = self.world.vitals.columns
+
+        damage = []
+        for attacker_slot, defender_slot in zip(attacker_slots, defender_slots):
+            level = min(columns['level'][attacker_slot], len(damage_ranges) - 1)
+            gap = min(max(level - columns['level'][defender_slot], -MAX_LEVEL_GAP), MAX_LEVEL_GAP)
+            if random.random() < hit_chances[gap + MAX_LEVEL_GAP]:
+                damage.append(random.randint(*damage_ranges[level]))
+                columns['hp'][defender_slot] = max(columns['hp'][defender_slot] - damage[-1], 0)
+            else:
+                damage.append(0)
+        return damage, sorted({slot for slot in defender_slots if columns['hp'][slot] == 0})
+
+    def report(self, pairs, damage):
+        # Only rooms with someone to read the result get any text, and each reader gets one write per round
+        watched = {player.location for player in self.world.players.values()}
+        if not watched:
+            return
+
+        lines = {}
+        for (attacker, defender), amount in zip(pairs, damage):
+            if attacker.location not in watched:
+                continue
+            if amount:
+                lines.setdefault(attacker.location, []).append(f'{attacker.name} hits {defender.name} for {amount} damage.')
+            else:
+                lines.setdefault(attacker.location, []).append(f'{attacker.name} misses {defender.name}.')
+
+        for room_id, room_lines in lines.items():
+            text = '\r\n'.join(room_lines)
+            for character in self.world.rooms[room_id].characters:
+                if hasattr(character, 'send_line'):
+                    character.send_line(text)
+
+    def kill(self, character):
+        # Engagements with the dead lapse on their own next round, once the slot is freed or the room differs
+        for other in self.world.rooms[character.location].characters:
+            if other is not character and hasattr(other, 'send_line'):
+                other.send_line(f'{character.name} has been slain!')
+
+        if character.id in self.world.denizens:
+            self.world.remove_denizen(character)
+        else:
+            log(f'Player <{character.name}> was slain in <{character.location}>', 'COMBAT')
+            character.send_line('You have been slain!  You awaken somewhere familiar...')
+            character.hp = character.max_hp
+            self.world.move_character(character, self.world.rooms[self.world.config['default_location']])
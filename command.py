@@ -40,6 +40,13 @@ single_character_aliases = {
 }
 
 
+def parse_target(words):
+    # "3rd guard" picks the third match; anything without an ordinal picks the first
+    if words and words[0] in ordinal_dict:
+        return ' '.join(words[1:]), ordinal_dict[words[0]].value
+    return ' '.join(words), 1
+
+
 class PrepositionalPhrase(object):
     def __init__(self, preposition, obj):
         self.preposition = preposition
@@ -93,8 +100,7 @@ class MessageParser(object):
 
 
 def process_command(parsed_message, register):
-    for i in sorted(register.keys()):
-        for register_item in register[i]:
-            if parsed_message.verb == register_item[0]:
-                return register_item[1](parsed_message)
-    return False
+    command = register.get(parsed_message.verb)
+    if command is None:
+        return False
+    return command(parsed_message)
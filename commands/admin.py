@@ -0,0 +1,69 @@
+import copyover as copyover_server
+from commands.commands import Command, CommandStatus, register_commands
+from common import log
+from world import World
+
+
+def is_admin(character):
+    return character.name in World().config['admins']
+
+
+@Command
+def reload(message):
+    if not is_admin(message.speaker):
+        return False
+
+    if message.args != ['commands']:
+        message.speaker.send_line('Usage: reload commands')
+        return CommandStatus.FAILURE
+
+    try:
+        register = register_commands(reload=True)
+        register.load_all()
+    except Exception as e:
+        log(f'Command reload by <{message.speaker.name}> failed: {e!r}', 'ERROR')
+        message.speaker.send_line(f'- Reload failed, keeping the current commands: {e!r}')
+        return CommandStatus.FAILURE
+
+    # A single assignment, so dispatch sees either the old registry or the new one, never a mix
+    World().command_register = register
+    log(f'Commands reloaded by <{message.speaker.name}>: {len(register.commands)} verbs', 'ADMIN')
+    message.speaker.send_line(f'- Reloaded {len(register.commands)} commands.')
+    return CommandStatus.SUCCESS
+
+
+@Command
+def copyover(message):
+    if not is_admin(message.speaker):
+        return False
+
+    log(f'Copyover requested by <{message.speaker.name}>', 'ADMIN')
+    copyover_server.copyover()
+    return CommandStatus.SUCCESS
+
+
+@Command
+def memstat(message):
+    if not is_admin(message.speaker):
+        return False
+
+    monitor = World().memstat
+    if not message.args:
+        for line in monitor.report():
+            message.speaker.send_line(line)
+    elif message.args == ['trace', 'start']:
+        monitor.start_trace()
+        message.speaker.send_line('- Allocation tracing started; use "memstat trace diff" to see growth since now.')
+    elif message.args == ['trace', 'diff']:
+        lines = monitor.diff_trace()
+        if lines is None:
+            message.speaker.send_line('- Allocation tracing is not running.')
+        for line in lines or []:
+            message.speaker.send_line(line)
+    elif message.args == ['trace', 'stop']:
+        monitor.stop_trace()
+        message.speaker.send_line('- Allocation tracing stopped.')
+    else:
+        message.speaker.send_line('Usage: memstat [trace start|diff|stop]')
+        return CommandStatus.FAILURE
+    return CommandStatus.SUCCESS
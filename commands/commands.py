@@ -1,12 +1,14 @@
+import ast
 import enum
-import glob
 import importlib
-import os
+import importlib.util
+import json
 import sys
 import types
 
-from collections import defaultdict
+from pathlib import Path
 from command import Prepositions
+from common import log
 
 DEFAULT_PRIORITY = 3
 
@@ -64,43 +66,122 @@ class Alias(Command):
         if self.target is not None:
             #TODO add logging
             return
-        for i in sorted(registry.keys()):
-            for register_item in registry[i]:
-                if self.target_name == register_item[0]:
-                    self.target = register_item[1]
-                    break
-
-
-def register_commands():
-    module_names = glob.glob(os.path.join(sigma_path(), "commands", '*.py'))
-    registry = defaultdict(lambda: [])
-    aliases = []
-    for name in module_names:
-        module_name = convert_name(name)
-        module = importlib.import_module(module_name)
-        for fn in dir(module):
-            if isinstance(getattr(module, fn), Command):
-                registry[getattr(module, fn).priority].append((fn, getattr(module, fn),))
-            if isinstance(getattr(module, fn), Alias):
-                aliases.append(getattr(module, fn))
-
-    for entry in registry:
-        registry[entry].sort(key=lambda x: x[0])
-        pass
-
-    for alias in aliases:
-        alias.link_target(registry)
-
-    return registry
-
-
-def convert_name(module_name):
-    if module_name.startswith(sigma_path()):
-        module_name = module_name[len(sigma_path()) + 1:]  # include the beginning slash
-    module_name = module_name.replace('/', '.')
-    return module_name[0:module_name.find('.py')] if module_name.find('.py') != 1 else module_name
-
-
-def sigma_path():
-    sigma_command = os.path.dirname(sys.argv[0])
-    return os.path.abspath(sigma_command)
+        self.target = registry.get(self.target_name)
+
+
+commands_path = Path(__file__).resolve().parent
+manifest_path = commands_path / '__pycache__' / 'manifest.json'
+
+
+class LazyCommand(object):
+    def __init__(self, registry, verb, module_name, priority):
+        self.registry = registry
+        self.verb = verb
+        self.module_name = module_name
+        self.priority = priority
+        self.command = None
+
+    def resolve(self):
+        if self.command is None:
+            self.command = getattr(self.registry.load_module(self.module_name), self.verb)
+            if isinstance(self.command, Alias):
+                self.command.link_target(self.registry)
+        return self.command
+
+    def __call__(self, *args, **kwargs):
+        # The module is imported the first time one of its verbs is dispatched, if the registry has not loaded it yet
+        return self.resolve()(*args, **kwargs)
+
+
+class CommandRegistry(object):
+    def __init__(self, manifest, modules=None):
+        self.modules = modules or {}
+
+        # The first entry per verb in (priority, verb) order wins, matching the former priority-bucket scan
+        self.commands = {}
+        for verb, module_name, priority in sorted(manifest, key=lambda entry: (entry[2], entry[0])):
+            if verb not in self.commands:
+                self.commands[verb] = LazyCommand(self, verb, module_name, priority)
+
+    def get(self, verb):
+        return self.commands.get(verb)
+
+    def load_all(self):
+        for command in self.commands.values():
+            command.resolve()
+
+    def load_module(self, module_name):
+        if module_name not in self.modules:
+            self.modules[module_name] = importlib.import_module(module_name)
+        return self.modules[module_name]
+
+
+def register_commands(reload=False):
+    manifest = build_manifest()
+    modules = {}
+    if reload:
+        # Every module is executed afresh before the registry exists, so a module that fails to load (for any
+        # reason) raises here and leaves the running commands, and the modules they came from, untouched
+        for module_name in sorted({module_name for _, module_name, _ in manifest}):
+            modules[module_name] = execute_module(module_name)
+        sys.modules.update(modules)
+    return CommandRegistry(manifest, modules)
+
+
+def execute_module(module_name):
+    spec = importlib.util.find_spec(module_name)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def build_manifest():
+    try:
+        cached = json.loads(manifest_path.read_text())
+    except (OSError, ValueError):
+        cached = {}
+
+    # Modules are keyed by file signature so that only changed files are parsed again
+    manifest = {}
+    for path in sorted(commands_path.glob('*.py')):
+        stat = path.stat()
+        signature = [stat.st_mtime_ns, stat.st_size]
+        entry = cached.get(path.name)
+        if entry is None or entry['signature'] != signature:
+            entry = {'signature': signature, 'commands': scan_module(path)}
+        manifest[path.name] = entry
+
+    if manifest != cached:
+        try:
+            manifest_path.parent.mkdir(exist_ok=True)
+            manifest_path.write_text(json.dumps(manifest))
+        except OSError:
+            pass
+
+    return [
+        (verb, f'{commands_path.name}.{Path(name).stem}', priority)
+        for name, entry in manifest.items()
+        for verb, priority in entry['commands']
+    ]
+
+
+def scan_module(path):
+    # Finds functions decorated with @Command/@Alias (bare or called) without importing the module
+    commands = []
+    for node in ast.parse(path.read_text(), str(path)).body:
+        if not isinstance(node, ast.FunctionDef):
+            continue
+        for decorator in node.decorator_list:
+            if isinstance(decorator, ast.Name) and decorator.id in ('Command', 'Alias'):
+                commands.append((node.name, DEFAULT_PRIORITY))
+            elif isinstance(decorator, ast.Call) and isinstance(decorator.func, ast.Name) and decorator.func.id in ('Command', 'Alias'):
+                priority = DEFAULT_PRIORITY
+                for keyword in decorator.keywords:
+                    if keyword.arg == 'priority':
+                        try:
+                            priority = ast.literal_eval(keyword.value)
+                        except ValueError:
+                            # Only a literal can be read without importing; the runtime value may differ
+                            log(f'Non-literal priority for command <{node.name}> in [{path.name}], using {DEFAULT_PRIORITY}', 'WARNING')
+                commands.append((node.name, priority))
+    return commands
@@ -1,9 +1,40 @@
+from command import parse_target
 from commands.commands import Alias, Command, CommandStatus
+from world import World, directions
 
 
 @Command
 def look(message):
-    message.speaker.send_line( str(message.speaker.location.desc))
+    if not message.args:
+        message.speaker.send_room()
+        return CommandStatus.SUCCESS
+
+    character = World().rooms[message.speaker.location].find_character(*parse_target(message.args), exclude=message.speaker)
+    if not character:
+        message.speaker.send_line('You do not see that here.')
+        return CommandStatus.FAILURE
+
+    message.speaker.send_line(' '.join((getattr(character, 'desc', None) or f'You see {character.name}.').split()))
+    return CommandStatus.SUCCESS
+
+
+@Command
+def quit(message):
+    message.speaker.send_line('- Goodbye!')
+    World().session_tokens.revoke(message.speaker.name)
+    message.speaker.connection.disconnect()
+    return CommandStatus.SUCCESS
+
+
+@Command
+def kill(message):
+    victim = World().rooms[message.speaker.location].find_character(*parse_target(message.args), exclude=message.speaker)
+    if not victim:
+        message.speaker.send_line('There is nobody here by that name.')
+        return CommandStatus.FAILURE
+
+    message.speaker.send_line(f'You attack {victim.name}!')
+    World().combat.engage(message.speaker, victim)
     return CommandStatus.SUCCESS
 
 
@@ -67,6 +98,46 @@ def southeast(message):
     pass
 
 
+@Alias(target='go', priority=1)
+def e(message):
+    pass
+
+
+@Alias(target='go', priority=1)
+def east(message):
+    pass
+
+
+@Alias(target='go', priority=1)
+def w(message):
+    pass
+
+
+@Alias(target='go', priority=1)
+def west(message):
+    pass
+
+
+@Alias(target='go', priority=1)
+def u(message):
+    pass
+
+
+@Alias(target='go', priority=1)
+def up(message):
+    pass
+
+
+@Alias(target='go', priority=1)
+def d(message):
+    pass
+
+
+@Alias(target='go', priority=1)
+def down(message):
+    pass
+
+
 @Alias(target='go', priority=1)
 def enter(message):
     pass
@@ -78,5 +149,18 @@ def leave(message):
 
 @Command(priority=1)
 def go(message):
-    message.speaker.send_line('go called!')
+    # Movement aliases arrive with the direction as the verb
+    direction = message.verb if message.verb != 'go' else ' '.join(message.args)
+    direction = {label: short for short, label in directions.items()}.get(direction, direction)
+
+    exit_ = World().rooms[message.speaker.location].exits.get(direction)
+    if not exit_:
+        message.speaker.send_line('You cannot go that way.')
+        return CommandStatus.FAILURE
+    if exit_.door and exit_.door.closed:
+        message.speaker.send_line(f'The way {exit_.direction_label} is closed.')
+        return CommandStatus.FAILURE
+
+    World().move_character(message.speaker, exit_.target, direction)
+    message.speaker.send_room()
     return CommandStatus.SUCCESS
@@ -0,0 +1,246 @@
+from array import array
+from collections import deque
+import pickle
+
+import yaml
+
+from common import log
+from events import trigger_problems
+from world import World, canonical_id, compiled_format, exit_directions, valid_directions
+
+
+area_fields = {'name', 'rooms', 'doors', 'denizens', 'triggers'}
+room_fields = {'name', 'desc', 'exits'}
+exit_fields = {'target', 'door'}
+door_fields = {'closed', 'locked'}
+denizen_fields = {'name', 'keywords', 'short', 'desc', 'stats'}
+
+
+class WorldCompiler:
+    def __init__(self, default_location):
+        self.default_location = default_location
+
+        # Unlike a normal import, every problem is collected so they can all be reported at once
+        self.errors = []
+        self.warnings = []
+
+        self.area_files = []
+        self.areas = {}
+        self.rooms = {}
+        self.doors = {}
+        self.denizen_sources = {}
+        self.triggers = []
+
+    def error(self, where, text):
+        self.errors.append(f'{where}: {text}')
+
+    def warning(self, where, text):
+        self.warnings.append(f'{where}: {text}')
+
+    def unknown_fields(self, where, data, fields):
+        for field in sorted(set(data) - fields, key=str):
+            self.error(where, f'Unknown parameter "{field}"')
+
+    def mapping(self, where, value, description):
+        # Anything left empty in YAML comes through as None, which is fine; any other non-mapping is an error
+        if value is None:
+            return {}
+        if type(value) != dict:
+            self.error(where, f'{description} must be a mapping, not <{value}>')
+            return {}
+        return value
+
+    def local_id(self, where, area_id, id):
+        if type(id) != str:
+            self.error(where, f'Invalid identifier <{id}>')
+            return None
+        components = id.split(':', 1)
+        if len(components) == 2 and components[0] != area_id:
+            self.error(where, f'External reference <{id}> provided when only a local one (in <{area_id}>) is valid')
+            return None
+        return canonical_id(area_id, id)
+
+    def read_area_file(self, area_file):
+        self.area_files.append(area_file.name)
+        area_id = area_file.stem
+        with area_file.open() as f:
+            try:
+                data = yaml.safe_load(f) or {}
+            except yaml.YAMLError as e:
+                self.error(f'Area <{area_id}>', f'Unable to parse [{area_file.name}]: {e}')
+                return
+        if type(data) != dict:
+            self.error(f'Area <{area_id}>', 'Area file must be a mapping')
+            return
+        self.read_area(area_id, data)
+
+    def read_area(self, area_id, data):
+        where = f'Area <{area_id}>'
+        self.unknown_fields(where, data, area_fields)
+        self.areas[area_id] = data.get('name') or area_id
+
+        for room_id, room in self.mapping(where, data.get('rooms'), 'Rooms').items():
+            self.read_room(area_id, room_id, self.mapping(f'{where}: Room <{room_id}>', room, 'Room'))
+
+        for door_id, door in self.mapping(where, data.get('doors'), 'Doors').items():
+            door_where = f'{where}: Door <{door_id}>'
+            door = self.mapping(door_where, door, 'Door')
+            self.unknown_fields(door_where, door, door_fields)
+            door_canonical_id = self.local_id(door_where, area_id, door_id)
+            if door_canonical_id:
+                self.doors[door_canonical_id] = (area_id, door_id, door.get('closed', True), door.get('locked', False))
+
+        for denizen_id, denizen in self.mapping(where, data.get('denizens'), 'Denizens').items():
+            denizen_where = f'{where}: Denizen <{denizen_id}>'
+            denizen = self.mapping(denizen_where, denizen, 'Denizen')
+            self.unknown_fields(denizen_where, denizen, denizen_fields)
+            if not denizen.get('name'):
+                self.error(denizen_where, 'Must have a "name" parameter')
+            source_id = self.local_id(denizen_where, area_id, denizen_id)
+            if source_id:
+                self.denizen_sources[source_id] = (area_id, denizen_id, denizen)
+
+        triggers = data.get('triggers') or []
+        if type(triggers) != list:
+            self.error(where, f'Triggers must be a list, not <{triggers}>')
+            triggers = []
+        for index, trigger in enumerate(triggers):
+            trigger_where = f'{where}: Trigger <{index}>'
+            self.read_trigger(area_id, index, self.mapping(trigger_where, trigger, 'Trigger'))
+
+    def read_room(self, area_id, room_id, room):
+        where = f'Area <{area_id}>: Room <{room_id}>'
+        self.unknown_fields(where, room, room_fields)
+        if not room.get('name') or not room.get('desc'):
+            self.error(where, 'Must have "name" and "desc" parameters')
+        elif type(room['name']) != str or type(room['desc']) != str:
+            self.error(where, '"name" and "desc" must be text')
+
+        exits = {}
+        for direction, exit_ in self.mapping(where, room.get('exits'), 'Exits').items():
+            exit_where = f'{where}: Exit <{direction}>'
+            if type(direction) != str or direction not in valid_directions:
+                self.error(where, f'Invalid exit direction: {direction}')
+                continue
+            if type(exit_) != dict:
+                exit_ = {'target': exit_}
+            self.unknown_fields(exit_where, exit_, exit_fields)
+            target, door = exit_.get('target'), exit_.get('door')
+            if not target:
+                self.error(exit_where, 'Must supply a target room')
+                continue
+            if type(target) != str:
+                self.error(exit_where, f'Target must be a room id, not <{target}>')
+                continue
+            if door is not None and type(door) != str:
+                self.error(exit_where, f'Door must be a door id, not <{door}>')
+                door = None
+            exits[direction] = (canonical_id(area_id, target), canonical_id(area_id, door) if door else None)
+
+        room_canonical_id = self.local_id(where, area_id, room_id)
+        if room_canonical_id:
+            self.rooms[room_canonical_id] = (area_id, room_id, room.get('name'), room.get('desc'), exits)
+
+    def read_trigger(self, area_id, index, trigger):
+        where = f'Area <{area_id}>: Trigger <{index}>'
+        self.unknown_fields(where, [key for key in trigger if type(key) != str], set())
+        trigger = {key: value for key, value in trigger.items() if type(key) == str}
+
+        # The same checks the loader makes, so a world that compiles also loads
+        for problem in trigger_problems(**trigger):
+            self.error(where, problem)
+        if trigger.get('room') is None or type(trigger['room']) == str:
+            self.triggers.append((area_id, index, trigger))
+
+    def check_graph(self):
+        for room_id, (area_id, local_room_id, _, _, exits) in self.rooms.items():
+            for direction, (target, door) in exits.items():
+                where = f'Area <{area_id}>: Room <{local_room_id}>: Exit <{direction}>'
+                if door and door not in self.doors:
+                    self.error(where, f'Unable to resolve door <{door}>')
+                if target not in self.rooms:
+                    self.error(where, f'Unable to resolve target <{target}>')
+                    continue
+
+                # Most passages run both ways, and a door should be on both sides of one
+                returns = [back_door for back_target, back_door in self.rooms[target][4].values() if back_target == room_id]
+                if not returns:
+                    self.warning(where, f'One-way exit to <{target}>')
+                elif door and door not in returns:
+                    self.warning(where, f'Door <{door}> is not on the exit back from <{target}>')
+
+        used_doors = {door for room in self.rooms.values() for _, door in room[4].values()}
+        for door_id in self.doors:
+            if door_id not in used_doors:
+                self.warning(f'Door <{door_id}>', 'Not used by any exit')
+
+        for area_id, index, trigger in self.triggers:
+            if trigger.get('room') and canonical_id(area_id, trigger['room']) not in self.rooms:
+                self.error(f'Area <{area_id}>: Trigger <{index}>', f'Unable to resolve room <{trigger["room"]}>')
+
+        if self.default_location not in self.rooms:
+            self.error('Config', f'Default location <{self.default_location}> is not a room')
+            return
+
+        reached = {self.default_location}
+        pending = deque(reached)
+        while pending:
+            for target, _ in self.rooms[pending.popleft()][4].values():
+                if target in self.rooms and target not in reached:
+                    reached.add(target)
+                    pending.append(target)
+        for room_id in self.rooms:
+            if room_id not in reached:
+                self.warning(f'Room <{room_id}>', f'Unreachable from <{self.default_location}>')
+
+    def artifact(self):
+        # Rooms and doors are numbered densely; exits become one row of targets per room, -1 where there is none
+        numbers = {room_id: number for number, room_id in enumerate(self.rooms)}
+        door_numbers = {door_id: number for number, door_id in enumerate(self.doors)}
+
+        exits = array('i', [-1] * (len(self.rooms) * len(exit_directions)))
+        exit_doors = array('i', exits)
+        for number, (_, _, _, _, room_exits) in enumerate(self.rooms.values()):
+            for column, direction in enumerate(exit_directions):
+                if direction in room_exits:
+                    target, door = room_exits[direction]
+                    exits[number * len(exit_directions) + column] = numbers[target]
+                    exit_doors[number * len(exit_directions) + column] = door_numbers[door] if door else -1
+
+        return {
+            'format': compiled_format,
+            'area_files': self.area_files,
+            'areas': self.areas,
+            'rooms': [(area_id, room_id, name, desc) for area_id, room_id, name, desc, _ in self.rooms.values()],
+            'doors': list(self.doors.values()),
+            'exits': exits,
+            'exit_doors': exit_doors,
+            'denizen_sources': self.denizen_sources,
+            'triggers': self.triggers,
+        }
+
+
+def compile_world(config_root):
+    w = World()
+    w.load_config(config_root)
+
+    compiler = WorldCompiler(w.config['default_location'])
+    for area_file in sorted((config_root / 'areas').glob('*.yaml')):
+        log(f'Reading area from [{area_file.relative_to(config_root)}]', 'COMPILE', trivial=True)
+        compiler.read_area_file(area_file)
+    compiler.check_graph()
+
+    for warning in compiler.warnings:
+        log(warning, 'WARNING')
+    for error in compiler.errors:
+        log(error, 'ERROR')
+
+    if compiler.errors:
+        log(f'Compilation failed with {len(compiler.errors)} errors and {len(compiler.warnings)} warnings', 'COMPILE')
+        return 1
+
+    compiled_file = config_root / 'world.compiled'
+    with compiled_file.open('wb') as f:
+        pickle.dump(compiler.artifact(), f, protocol=pickle.HIGHEST_PROTOCOL)
+    log(f'Compiled {len(compiler.rooms)} rooms in {len(compiler.areas)} areas to [{compiled_file.relative_to(config_root)}] with {len(compiler.warnings)} warnings', 'COMPILE')
+    return 0
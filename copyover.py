@@ -0,0 +1,80 @@
+from pathlib import Path
+import asyncio
+import base64
+import json
+import os
+import socket
+import sys
+import time
+
+from common import log
+from world import World
+
+
+script_path = Path(__file__).resolve().parent / 'sigma.py'
+
+
+def copyover():
+    w = World()
+    state = {
+        'started': time.time(),
+        'session_secret': base64.b64encode(w.session_tokens.secret).decode('ascii'),
+        'session_tokens': w.session_tokens.issued,
+        'connections': [],
+    }
+
+    # Door and denizen changes since the last checkpoint would otherwise be lost with this process
+    w.checkpointer.flush()
+
+    for player in w.players.values():
+        w.save_player_data(player)
+
+        connection = player.connection
+        if connection.render_protocol != 'telnet':
+            # Websocket framing state cannot cross the exec, but the client's resume token will survive it
+            connection.write_line('- The server is restarting, reconnecting shortly...')
+            continue
+
+        # Telnet sockets are inherited across the exec and picked back up by the new process
+        fd = connection.transport.get_extra_info('socket').fileno()
+        os.set_inheritable(fd, True)
+        state['connections'].append({
+            'fd': fd,
+            'peername': connection.peername,
+            'name': player.name,
+            'proto': player.to_proto(),
+            'gmcp': connection.gmcp,
+        })
+        connection.write_line('- The world shimmers and reforms around you...')
+
+    state_file = w.config_root / 'copyover.json'
+    with os.fdopen(os.open(state_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+        json.dump(state, f)
+
+    log(f"Copyover: handing {len(state['connections'])} telnet connections to a new server process", 'SERVER')
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.execv(sys.executable, [sys.executable, str(script_path), '--root', str(w.config_root), '--copyover', str(state_file)])
+
+
+async def restore(state_file):
+    from network import TelnetConnection
+
+    w = World()
+    with state_file.open() as f:
+        state = json.load(f)
+    state_file.unlink()
+
+    w.session_tokens.secret = base64.b64decode(state['session_secret'])
+    w.session_tokens.issued = state['session_tokens']
+
+    loop = asyncio.get_running_loop()
+    for entry in state['connections']:
+        try:
+            sock = socket.socket(fileno=entry['fd'])
+        except OSError as e:
+            log(f"Copyover: unable to reattach <{entry['name']}> from {entry['peername']}: {e}", 'SERVER')
+            continue
+        await loop.connect_accepted_socket(lambda entry=entry: TelnetConnection(restore=entry), sock)
+
+    log(f"Copyover: restored {len(state['connections'])} telnet connections after {(time.time() - state['started']) * 1000:.0f}ms", 'SERVER')
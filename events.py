@@ -0,0 +1,117 @@
+import inspect
+import time
+from enum import Enum
+
+from common import log
+
+
+class EventType(Enum):
+    ENTER = 'enter'
+    LEAVE = 'leave'
+    LOGIN = 'login'
+    LOGOUT = 'logout'
+    COMMAND = 'command'
+
+
+class Event(object):
+    def __init__(self, type, room, character=None, **data):
+        self.type = type
+        self.room = room
+        self.character = character
+        self.data = data
+
+
+# Actions that area files may attach to events, each called with the event and the trigger's remaining parameters
+def action_message(event, text):
+    if hasattr(event.character, 'send_line'):
+        event.character.send_line(text)
+
+
+def action_echo(event, text):
+    for character in event.room.characters:
+        if character is not event.character and hasattr(character, 'send_line'):
+            character.send_line(text)
+
+
+trigger_actions = {
+    'message': action_message,
+    'echo': action_echo,
+}
+
+
+def trigger_problems(event=None, action=None, room=None, scope=None, **params):
+    # Shared by the loader and the offline compiler, so both hold area files to the same rules
+    problems = []
+    if type(event) != str or event not in {event_type.value for event_type in EventType}:
+        problems.append(f'Unknown event <{event}>')
+
+    if type(action) != str or action not in trigger_actions:
+        problems.append(f'Unknown action <{action}>')
+    else:
+        try:
+            inspect.signature(trigger_actions[action]).bind(None, **params)
+        except TypeError as e:
+            problems.append(f'Parameters do not suit action <{action}>: {e}')
+
+    if room is not None and type(room) != str:
+        problems.append(f'Room must be a room id, not <{room}>')
+    else:
+        scope = scope or ('room' if room else 'area')
+        if scope not in ('room', 'area', 'global') or (scope == 'room') != bool(room):
+            problems.append('Scope must be room, area or global, and only room scope may name a room')
+
+    return problems
+
+
+class Trigger(object):
+    def __init__(self, area_id, index, event=None, action=None, room=None, scope=None, **params):
+        for problem in trigger_problems(event, action, room, scope, **params):
+            log(f'Area <{area_id}>: Trigger <{index}>: {problem}', exit_code=1)
+
+        self.area_id = area_id
+        self.event_type = EventType(event)
+        self.action = trigger_actions[action]
+        self.room = room
+        self.scope = scope or ('room' if room else 'area')
+        self.params = params
+
+    def __call__(self, event):
+        self.action(event, **self.params)
+
+
+class EventBus(object):
+    def __init__(self, world):
+        self.world = world
+
+        # {(scope, key): {EventType: [handler, ...]}} so dispatch only visits the subscribers in scope
+        self.subscribers = {}
+
+        # Handlers that have overrun the time budget are no longer run inline
+        self.slow_handlers = set()
+
+    def subscribe(self, event_type, handler, room=None, area=None):
+        if room:
+            key = ('room', room)
+        elif area:
+            key = ('area', area)
+        else:
+            key = ('global', None)
+        self.subscribers.setdefault(key, {}).setdefault(event_type, []).append(handler)
+
+    def publish(self, event):
+        for key in (('room', event.room.canonical_id), ('area', event.room.area_id), ('global', None)):
+            for handler in self.subscribers.get(key, {}).get(event.type, ()):
+                self.dispatch(handler, event)
+
+    def dispatch(self, handler, event):
+        if handler in self.slow_handlers:
+            self.world.defer(handler, event)
+            return
+
+        # A failing area script is logged like any other, rather than unwinding the move or login that published the event
+        start = time.perf_counter()
+        self.world.run_guarded(handler, event)
+        elapsed = time.perf_counter() - start
+        if elapsed > self.world.config['event_handler_budget']:
+            log(f'Event handler {handler} took {elapsed * 1000:.1f}ms, deferring it to the tick from now on', 'EVENT')
+            self.slow_handlers.add(handler)
@@ -0,0 +1,84 @@
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+
+from common import log
+
+
+def tracked_types():
+    from character import Denizen, Player
+    from network import TelnetConnection, WebsocketConnection
+    from world import Door, Exit, Room
+    return (Room, Exit, Door, Player, Denizen, TelnetConnection, WebsocketConnection)
+
+
+def census():
+    # Walks the whole heap, so this only ever runs on demand or on the sampler's schedule
+    types = tracked_types()
+    totals = {cls.__name__: [0, 0] for cls in types}
+    for obj in gc.get_objects():
+        if isinstance(obj, types):
+            total = totals[type(obj).__name__]
+            total[0] += 1
+            total[1] += sys.getsizeof(obj) + sys.getsizeof(getattr(obj, '__dict__', None))
+
+    try:
+        tasks = asyncio.all_tasks()
+    except RuntimeError:   # No running loop
+        tasks = ()
+    totals['Task (pending)'] = [len(tasks), sum(sys.getsizeof(task) for task in tasks)]
+    return totals
+
+
+class MemoryMonitor:
+    def __init__(self, world):
+        self.world = world
+        self.last_sample = None
+        self.last_sample_time = time.time()
+        self.trace_baseline = None
+
+    def report(self):
+        lines = [f'{"Type" : <20} {"Count" : >8} {"Approx. bytes" : >14}']
+        for name, (count, size) in census().items():
+            lines.append(f'{name : <20} {count : >8} {size : >14}')
+
+        render = self.world.render_cache.stats()
+        lines.append(f'Render cache: {render["entries"]} entries, {render["bytes"]} bytes, {render["hit_rate"]:.0%} hit rate')
+        lines.append(f'Player cache: {len(self.world.player_cache)} records, {self.world.player_cache_stats}')
+        return lines
+
+    def start_trace(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.trace_baseline = tracemalloc.take_snapshot()
+
+    def diff_trace(self, limit=10):
+        # Compares against the previous snapshot, which then becomes the new baseline
+        if not tracemalloc.is_tracing():
+            return None
+        snapshot = tracemalloc.take_snapshot()
+        stats = snapshot.compare_to(self.trace_baseline, 'lineno')[:limit]
+        self.trace_baseline = snapshot
+        return [str(stat) for stat in stats]
+
+    def stop_trace(self):
+        tracemalloc.stop()
+        self.trace_baseline = None
+
+    def step(self):
+        interval = self.world.config['memstat_interval']
+        if not interval or time.time() - self.last_sample_time < interval:
+            return
+        self.last_sample_time = time.time()
+
+        sample = census()
+        if self.last_sample:
+            growth = []
+            for name, (count, size) in sample.items():
+                last_count, last_size = self.last_sample[name]
+                if count != last_count or size != last_size:
+                    growth.append(f'{name} {count - last_count:+d} ({size - last_size:+d} bytes)')
+            log('Growth since last sample: ' + (', '.join(growth) or 'none'), 'MEMSTAT', trivial=not growth)
+        self.last_sample = sample
@@ -2,18 +2,23 @@ import asyncio
 import string
 import time
 import json
+from collections import deque
 
 import bcrypt
 import websockets
 from websockets.server import WebSocketServerProtocol
 
+import protocol
 from common import log
 from command import MessageParser, process_command
+from events import Event, EventType
 from world import World
 from character import Player
 
 
 class BaseConnection(asyncio.Protocol):
+    refreshes_resume_token = False
+
     def connection_made(self, transport):
         super().connection_made(transport)
 
@@ -22,16 +27,29 @@ class BaseConnection(asyncio.Protocol):
         self.player = None
         self.last_activity = time.time()
         self.peername = None
+        self.resume_token_expiry = 0
+        self.disconnecting = False
+
+        # Lines waiting for the tick, plus how many were turned away since the player was last told
+        self.input_queue = deque()
+        self.input_dropped = 0
+
+        # After a failed password the tick leaves this connection's queue alone until then
+        self.input_held_until = 0
 
     def connection_lost(self, exc):
         super().connection_lost(exc)
 
+        self.input_queue.clear()
         if self.player:
             World().remove_player(self.player)
 
     def write(self, *txts, context='game'):
         raise NotImplementedError()
     
+    def write_data(self, package, data):
+        raise NotImplementedError()
+
     def write_line(self, line=''):
         self.write(line + '\r\n')
 
@@ -58,6 +76,18 @@ class BaseConnection(asyncio.Protocol):
             self.write(welcome_message)
         self.write_prompt(2)
 
+    def enqueue(self, line):
+        # Entering a name stays synchronous with the client (echo and input rules depend on the state), but anything
+        # that hashes a password waits for the tick like commands do, so pasted guesses cannot stall the loop
+        if self.interpreter_state in ('welcome', 'create_username') and not self.input_queue:
+            self.process(line)
+        elif len(self.input_queue) >= World().config['input_queue_size']:
+            self.input_dropped += 1
+        else:
+            self.input_queue.append(line)
+            if len(self.input_queue) == 1:
+                World().input_ready.append(self)
+
     def process(self, line):
         self.last_activity = time.time()
         getattr(self, 'process_' + self.interpreter_state)(line)
@@ -69,6 +99,10 @@ class BaseConnection(asyncio.Protocol):
             self.write_prompt()
             return
 
+        if line.startswith('resume '):
+            self.process_resume(line[len('resume '):])
+            return
+
         self.player_data = World().retrieve_player_data(line)
         if not self.player_data[1]:
             self.write_line('- That name is not known here.')
@@ -87,33 +121,79 @@ class BaseConnection(asyncio.Protocol):
         
         player_proto, name, password_hash = self.player_data
         if bcrypt.checkpw(line.encode('ascii'), password_hash.encode('ascii')):
-            self.player = Player(self, name, **player_proto)
-            if World().insert_player(self.player):
-                self.write_line('- Welcome back!')
-                self.interpreter_state = 'playing'
-                self.write_prompt()
-            else:
-                self.player = World().players.get(name, None)
-                if self.player:
-                    self.write_line('- You are already logged in.  Rejoining...')
-                    log(f'Player <{name}>: Remapping from {self.player.connection.peername} to {self.peername}', 'CLIENT')
-
-                    # Disassociate the old connection from the player and then close it
-                    self.player.connection.player = None
-                    self.player.connection.transport.close()
-
-                    # Associate the existing player with this new connection
-                    self.player.connection = self
-
-                    self.interpreter_state = 'playing'
-                    self.write_prompt()
-                else:
-                    self.write_line('- Unable to join, please try again later.')
-                    self.interpreter_state = 'welcome'
-                    self.write_prompt()
+            self.enter_game(player_proto, name)
         else:
             self.write_line('- Incorrect password.')
+            self.hold_input()
+            self.write_prompt()
+
+    def hold_input(self):
+        # Anything typed ahead of the failure is discarded, and the next attempt waits out the retry delay
+        self.input_queue.clear()
+        self.input_held_until = time.time() + World().config['login_retry_delay']
+
+    def process_resume(self, token):
+        # A valid resume token stands in for the password, skipping bcrypt entirely
+        name = World().session_tokens.verify(token)
+        if not name:
+            self.write_line('- That session can no longer be resumed.  Please log in again.')
+            self.write_prompt()
+            return
+
+        if name in World().players:
+            self.rejoin(World().players[name])
+            return
+
+        player_proto, name, _ = World().retrieve_player_data(name)
+        if not name:
+            self.write_line('- That name is not known here.')
             self.write_prompt()
+            return
+        self.enter_game(player_proto, name)
+
+    def enter_game(self, player_proto, name):
+        self.player = Player(self, name, **player_proto)
+        if World().insert_player(self.player):
+            self.write_line('- Welcome back!')
+            self.issue_resume_token()
+            self.interpreter_state = 'playing'
+            self.write_prompt()
+        else:
+            self.player = World().players.get(name, None)
+            if self.player:
+                self.rejoin(self.player)
+            else:
+                self.write_line('- Unable to join, please try again later.')
+                self.interpreter_state = 'welcome'
+                self.write_prompt()
+
+    def rejoin(self, player):
+        self.write_line('- You are already logged in.  Rejoining...')
+        log(f'Player <{player.name}>: Remapping from {player.connection.peername} to {self.peername}', 'CLIENT')
+
+        # Disassociate the old connection from the player and then close it
+        player.connection.player = None
+        player.connection.disconnect()
+
+        # Associate the existing player with this new connection, which needs a full status snapshot
+        player.connection = self
+        player.sent_status = {}
+        self.player = player
+
+        self.issue_resume_token()
+        self.interpreter_state = 'playing'
+        self.write_prompt()
+
+    def issue_resume_token(self):
+        token, self.resume_token_expiry = World().session_tokens.issue(self.player.name)
+        self.write_resume_token(token)
+
+    def write_resume_token(self, token):
+        self.write_line(f'- To resume this session if you are disconnected, enter: resume {token}')
+
+    def disconnect(self):
+        self.disconnecting = True
+        self.transport.close()
 
     def process_create_username(self, line):
         if line == '':
@@ -125,7 +205,7 @@ class BaseConnection(asyncio.Protocol):
             self.write_prompt()
             return
 
-        if World().retrieve_player_data(line)[1]:
+        if World().player_exists(line):
             self.write_line('- That name is already in use.')
             self.write_prompt()
             return
@@ -147,6 +227,7 @@ class BaseConnection(asyncio.Protocol):
         name, password_hash = self.player
         if not bcrypt.checkpw(line.encode('ascii'), password_hash.encode('ascii')):
             self.write_line('- Passwords do not match.')
+            self.hold_input()
             self.player = name
             self.interpreter_state = 'create_password'
             self.write_prompt()
@@ -154,12 +235,13 @@ class BaseConnection(asyncio.Protocol):
 
         self.player = Player(self, name)
         if World().insert_player(self.player):
-            self.interpreter_state = 'playing'
-            self.write_prompt()
-
             World().save_player_data(self.player)
             World().update_player_password(self.player, password_hash)
             log(f'New user committed to database: <{name}> from {self.peername}', 'LOGIN')
+
+            self.issue_resume_token()
+            self.interpreter_state = 'playing'
+            self.write_prompt()
         else:
             self.write_line('- Something went wrong.  Please try again.')
             self.player = None
@@ -169,8 +251,16 @@ class BaseConnection(asyncio.Protocol):
     def process_playing(self, line):
         msg = MessageParser(line).parse()
         msg.speaker = self.player
-        if process_command(msg, World().command_register) is False:
+        result = process_command(msg, World().command_register)
+        if result is False:
             self.write_line(f'What do you mean, "{line}"?  That is ridiculous.')
+        elif self.player:
+            World().events.publish(Event(EventType.COMMAND, World().rooms[self.player.location], self.player, verb=msg.verb, result=result))
+
+        # Keep the client's resume token from lapsing while the player is active
+        if self.refreshes_resume_token and self.player and not self.disconnecting and self.resume_token_expiry - time.time() < World().config['resume_token_ttl'] / 2:
+            self.issue_resume_token()
+
         self.write_prompt()
 
 
@@ -187,6 +277,7 @@ class Telnet:
     ECHO          = 1
     SGA           = 3
     LINEMODE      = 34
+    GMCP          = 201
 
 Telnet.known_symbols = {getattr(Telnet, symbol) : symbol for symbol in dir(Telnet) if type(getattr(Telnet, symbol)) == int}
 Telnet.to_text = lambda byte: Telnet.known_symbols.get(byte, str(byte))
@@ -201,7 +292,10 @@ class Ansi:
 
 
 class TelnetConnection(BaseConnection):
+    render_protocol = 'telnet'
+
     all_bufferable_characters = string.ascii_letters + string.digits + string.punctuation + ' '
+    resume_token_characters = string.ascii_letters + string.digits + '-_.'
 
     format_codes = {
         '{reset}': b'\x1B[0m',
@@ -216,16 +310,27 @@ class TelnetConnection(BaseConnection):
         '{bold}': b'\x1B[1m',
     }
 
+    def __init__(self, restore=None):
+        super().__init__()
+
+        # Connection state carried over from the previous server process by a copyover
+        self.restore = restore
+
     def connection_made(self, transport):
         super().connection_made(transport)
 
         self.peername = transport.get_extra_info('peername')[0] + ':' + str(transport.get_extra_info('peername')[1])
-        log(f'Telnet connection received from {self.peername}', 'CLIENT', trivial=True)
 
         self.buffer = b''
         self.ansi_escape = b''
         self.oob = b''
 
+        if self.restore:
+            self.reattach()
+            return
+
+        log(f'Telnet connection received from {self.peername}', 'CLIENT', trivial=True)
+
         # Inform client that we will remote echo
         self.transport.write(bytes([Telnet.IAC, Telnet.WILL, Telnet.ECHO]))
 
@@ -235,9 +340,26 @@ class TelnetConnection(BaseConnection):
         # Disable line buffering
         self.transport.write(bytes([Telnet.IAC, Telnet.WONT, Telnet.LINEMODE]))
 
+        # Offer the structured status channel, which stays off until the client agrees
+        self.gmcp = False
+        self.transport.write(bytes([Telnet.IAC, Telnet.WILL, Telnet.GMCP]))
+
         self.interpreter_state = 'welcome'
         self.write_greeting()
 
+    def reattach(self):
+        # The client already negotiated options and logged in with the previous process, so go straight to playing
+        self.gmcp = self.restore['gmcp']
+        self.player = Player(self, self.restore['name'], **self.restore['proto'])
+        if not World().insert_player(self.player):
+            self.player = None
+            self.disconnect()
+            return
+
+        self.interpreter_state = 'playing'
+        self.write_line('- The world settles back into place.')
+        self.write_prompt()
+
     def connection_lost(self, exc):
         super().connection_lost(exc)
 
@@ -251,6 +373,8 @@ class TelnetConnection(BaseConnection):
                 elif len(self.oob) == 1:   # We just switched to out-of-band (OOB) but now see it's an escaped IAC
                     # Switch back to in-band and ignore the IAC since we trash anything above 127
                     self.oob = b''
+                elif self.oob[1] == Telnet.SB:   # Inside a subnegotiation an IAC precedes SE (or escapes a data byte)
+                    self.oob += bytes([Telnet.IAC])
                 else:   # If we strangely receive an IAC during another OOB sequence, discard the previous OOB and restart
                     self.oob = b''
                     self.oob += bytes([Telnet.IAC])
@@ -258,9 +382,11 @@ class TelnetConnection(BaseConnection):
                 self.oob += bytes([byte])   # Buffer the byte regardless of its value
                 if len(self.oob) == 3 and self.oob[1] in Telnet.IAC_VERBS:   # Standard IAC sequence
                     #log(f'Telnet IAC from {self.peername} > ' + ' '.join([Telnet.to_text(i) for i in self.oob]), 'CLIENT', trivial=True)
+                    self.process_negotiation(self.oob[1], self.oob[2])
                     self.oob = b''
-                elif byte == Telnet.SE:   # End of a subnegotiation sequence
+                elif byte == Telnet.SE and self.oob[-2] == Telnet.IAC:   # End of a subnegotiation sequence
                     #log(f'Telnet IAC-SB from {self.peername} > ' + ' '.join([Telnet.to_text(i) for i in self.oob]), 'CLIENT', trivial=True)
+                    self.process_subnegotiation(self.oob[2:-2].replace(bytes([Telnet.IAC, Telnet.IAC]), bytes([Telnet.IAC])))
                     self.oob = b''
             elif byte < 128:
                 if self.ansi_escape:   # We are in the middle of processing an ANSI escape sequence
@@ -282,7 +408,7 @@ class TelnetConnection(BaseConnection):
                         self.buffer = self.buffer[:-1]
                 elif byte == ord('\n') or byte == 0:   # End of a line of text (including handling <CR> <NUL>)
                     self.transport.write(b'\r\n')
-                    self.process(self.buffer.decode('ascii'))
+                    self.enqueue(self.buffer.decode('ascii'))
                     self.buffer = b''
                 elif self.should_buffer(byte):   # Only echo and record what we are willing to accept
                     self.transport.write(bytes([byte]) if 'password' not in self.interpreter_state else b'*')
@@ -290,8 +416,23 @@ class TelnetConnection(BaseConnection):
             else:
                 pass   # Ignore null and upper-half bytes
 
+    def process_negotiation(self, verb, option):
+        if option == Telnet.GMCP and verb in (Telnet.DO, Telnet.DONT):
+            self.gmcp = verb == Telnet.DO
+            if self.gmcp and self.player:
+                self.player.sent_status = {}   # Start the newly-enabled channel from a full snapshot
+
+    def process_subnegotiation(self, payload):
+        if payload and payload[0] == Telnet.GMCP:
+            package, _, data = payload[1:].decode('utf-8', 'replace').partition(' ')
+            log(f'GMCP from {self.peername} > {package} {data}', 'CLIENT', trivial=True)
+
     def should_buffer(self, byte):
-        if self.interpreter_state in ('welcome', 'create_username'):
+        if self.interpreter_state == 'welcome' and b'resume '.startswith(self.buffer + bytes([byte])):
+            return True   # Still typing the "resume" keyword
+        elif self.interpreter_state == 'welcome' and self.buffer.startswith(b'resume '):
+            return chr(byte) in TelnetConnection.resume_token_characters
+        elif self.interpreter_state in ('welcome', 'create_username'):
             if len(self.buffer) == 0:
                 return chr(byte) in (string.ascii_uppercase + '+')
             elif self.interpreter_state != 'welcome' or self.buffer[0] != ord('+'):
@@ -302,18 +443,59 @@ class TelnetConnection(BaseConnection):
             return chr(byte) in TelnetConnection.all_bufferable_characters
 
     def write(self, *txts, context='game'):
-        for txt in txts:
-            self.transport.write(self.format_codes.get(txt, False) or txt.encode('ascii'))
+        self.transport.write(self.encode_tokens(txts))
+
+    @classmethod
+    def encode_tokens(cls, txts):
+        return b''.join(cls.format_codes.get(txt, False) or txt.encode('ascii') for txt in txts)
+
+    @staticmethod
+    def join_encoded(parts):
+        return b''.join(parts)
+
+    def write_encoded(self, encoded):
+        self.transport.write(encoded)
+
+    def write_data(self, package, data):
+        if self.gmcp:
+            payload = f'{package} {json.dumps(data)}'.encode('utf-8').replace(bytes([Telnet.IAC]), bytes([Telnet.IAC, Telnet.IAC]))
+            self.transport.write(bytes([Telnet.IAC, Telnet.SB, Telnet.GMCP]) + payload + bytes([Telnet.IAC, Telnet.SE]))
 
 
 class WebsocketConnection(BaseConnection, WebSocketServerProtocol):
+    refreshes_resume_token = True
+    render_protocol = 'tokens'
+
     def write(self, *txts, context='game'):
+        self.send_message(context, txts)
+
+    @staticmethod
+    def encode_tokens(txts):
+        return list(txts)
+
+    @staticmethod
+    def join_encoded(parts):
+        return [txt for part in parts for txt in part]
+
+    def write_encoded(self, encoded):
+        self.send_message('game', encoded)
+
+    def write_resume_token(self, token):
+        self.send_message('token', [token])
+
+    def write_data(self, package, data):
+        self.send_message('data', [package, json.dumps(data)])
+
+    def disconnect(self):
+        self.disconnecting = True
+        asyncio.get_running_loop().create_task(self.websocket_close())
+
+    def send_message(self, context, content):
+        message = protocol.encode(self.subprotocol, context, content)
+
         async def _send():
             await self.ensure_open()
-            await self.websocket_send(json.dumps({
-                'context': context,
-                'content': txts,
-            }))
+            await self.websocket_send(message)
 
         loop = asyncio.get_running_loop()
         loop.create_task(_send())
@@ -325,40 +507,35 @@ class WebsocketConnection(BaseConnection, WebSocketServerProtocol):
         self._interpreter_state = state
 
         if self._interpreter_state == 'welcome':
-            mask = "^((\\+)|([A-Z][A-Z,a-z]*))$"
+            mask = "^((\\+)|([A-Z][A-Z,a-z]*)|(resume [A-Za-z0-9_.-]+))$"
         elif self._interpreter_state == 'create_username':
             mask = "^([A-Z][A-Z,a-z]*)$"
         else:
             mask = ""
 
-        async def _send():
-            await self.ensure_open()
-            await self.websocket_send(json.dumps({
-                'context': 'state',
-                'content': {
-                    'state': state,
-                    'mask': mask,
-                },
-            }))
-        
-        loop = asyncio.get_running_loop()
-        loop.create_task(_send())
+        self.send_message('state', {
+            'state': state,
+            'mask': mask,
+        })
 
     interpreter_state = property(_get_interpreter_state, _set_interpreter_state)
 
     # Capture websocket subclass async methods distinctly to avoid confusion with BaseConnection methods
     websocket_send = WebSocketServerProtocol.send
     websocket_recv = WebSocketServerProtocol.recv
+    websocket_close = WebSocketServerProtocol.close
 
 
 async def websocket_handler(websocket):
     websocket.peername = f'{websocket.remote_address[0]}:{str(websocket.remote_address[1])}'
-    log(f'Websocket connection received from {websocket.peername}', 'CLIENT', trivial=True)
+    log(f'Websocket connection received from {websocket.peername} ({websocket.subprotocol or "no subprotocol"})', 'CLIENT', trivial=True)
+    if websocket.subprotocol == protocol.BINARY_DICT:
+        websocket.send_message('dictionary', protocol.dictionary)
     websocket.interpreter_state = 'welcome'
     websocket.write_greeting()
     while True:
         try:
-            websocket.process(await websocket.websocket_recv())
+            websocket.enqueue(await websocket.websocket_recv())
         except websockets.ConnectionClosedOK:
             log(f'Websocket connection from {websocket.peername} closed normally', 'CLIENT', trivial=True)
             break
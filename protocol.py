@@ -0,0 +1,107 @@
+import json
+
+
+# Websocket subprotocols, in order of server preference
+BINARY_DICT = 'sigma.binary+dict'
+BINARY = 'sigma.binary'
+JSON = 'sigma.json'
+subprotocols = [BINARY_DICT, BINARY, JSON]
+
+# Small integer tags sent in place of the context name in binary frames
+context_tags = {
+    'game': 0,
+    'prompt': 1,
+    'state': 2,
+    'dictionary': 3,
+    'token': 4,
+    'data': 5,
+}
+
+# Contexts whose content is an object rather than a list of strings, with their field order on the wire
+context_fields = {
+    'state': ('state', 'mask'),
+}
+
+# Strings common enough to be worth sending as a single dictionary reference
+dictionary = (
+    '{reset}', '{black}', '{red}', '{green}', '{yellow}', '{blue}', '{magenta}', '{cyan}', '{white}', '{bold}',
+    '\r\n', '', '> ',
+    'Enter your name (or + to create a new character): ',
+    'Your password: ',
+    'Enter the name you will use: ',
+    'Please re-enter your password: ',
+    'welcome', 'password', 'create_username', 'create_password', 'create_password_again', 'playing',
+    '^((\\+)|([A-Z][A-Z,a-z]*)|(resume [A-Za-z0-9_.-]+))$',
+    '^([A-Z][A-Z,a-z]*)$',
+    'Char.Status',
+)
+dictionary_index = {entry: i for i, entry in enumerate(dictionary)}
+
+
+def encode_varint(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return out
+
+
+def decode_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode_binary(context, content, use_dictionary=True):
+    # Each string is a varint header followed by its payload: an odd header is a dictionary
+    # reference (index in the upper bits), an even one carries the UTF-8 byte length
+    if context in context_fields:
+        content = [content[field] for field in context_fields[context]]
+
+    out = bytearray([context_tags[context]])
+    for txt in content:
+        index = dictionary_index.get(txt) if use_dictionary else None
+        if index is not None:
+            out += encode_varint((index << 1) | 1)
+        else:
+            encoded = txt.encode('utf-8')
+            out += encode_varint(len(encoded) << 1)
+            out += encoded
+    return bytes(out)
+
+
+def decode_binary(data):
+    # Headers say whether each string is a dictionary reference, so decoding needs no flag
+    context = next(name for name, tag in context_tags.items() if tag == data[0])
+    content = []
+    pos = 1
+    while pos < len(data):
+        header, pos = decode_varint(data, pos)
+        if header & 1:
+            content.append(dictionary[header >> 1])
+        else:
+            length = header >> 1
+            content.append(data[pos:pos + length].decode('utf-8'))
+            pos += length
+
+    if context in context_fields:
+        return context, dict(zip(context_fields[context], content))
+    return context, content
+
+
+def encode(subprotocol, context, content):
+    if subprotocol == BINARY_DICT and context != 'dictionary':
+        return encode_binary(context, content)
+    elif subprotocol in (BINARY, BINARY_DICT):
+        return encode_binary(context, content, use_dictionary=False)
+    else:
+        return json.dumps({
+            'context': context,
+            'content': content,
+        })
@@ -0,0 +1,75 @@
+import sys
+import textwrap
+
+
+class RenderCache:
+    def __init__(self, world):
+        self.world = world
+
+        # Keyed by (room id, protocol): the static part is built once, the dynamic part
+        # (exits with door state, occupants) whenever the room's version moves on
+        self.static = {}
+        self.dynamic = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, room, connection, viewer=None):
+        key = (room.canonical_id, connection.render_protocol)
+
+        static = self.static.get(key)
+        if static is None:
+            static = self.static[key] = connection.encode_tokens(self.static_tokens(room))
+
+        dynamic = self.dynamic.get(key)
+        if dynamic is None or dynamic[0] != room.version:
+            self.misses += 1
+            dynamic = self.dynamic[key] = (
+                room.version,
+                connection.encode_tokens(self.exit_tokens(room)),
+                [(character.id, connection.encode_tokens(self.occupant_tokens(character))) for character in room.characters],
+            )
+        else:
+            self.hits += 1
+
+        # Occupants are held by id rather than reference, so a cached room never keeps departed characters alive
+        _, exits, occupants = dynamic
+        viewer_id = viewer.id if viewer else None
+        return connection.join_encoded([static, exits] + [line for character_id, line in occupants if character_id != viewer_id])
+
+    def static_tokens(self, room):
+        desc = textwrap.fill(' '.join(room.desc.split()), width=self.world.config['wrap_width'])
+        return ['{bold}', '{cyan}', room.name, '{reset}', '\r\n', desc.replace('\n', '\r\n'), '\r\n']
+
+    def exit_tokens(self, room):
+        labels = []
+        for exit_ in room.exits.values():
+            if exit_.door and exit_.door.closed:
+                labels.append(f'{exit_.direction_label} (closed)')
+            else:
+                labels.append(exit_.direction_label)
+        return ['{green}', 'Exits: ', ', '.join(labels) or 'none', '{reset}', '\r\n']
+
+    def occupant_tokens(self, character):
+        return ['{yellow}', getattr(character, 'short', None) or f'{character.name} is here.', '{reset}', '\r\n']
+
+    def stats(self):
+        parts = list(self.static.values())
+        for _, exits, occupants in self.dynamic.values():
+            parts.append(exits)
+            parts += [line for _, line in occupants]
+
+        # Encoded parts are either bytes or lists of string tokens
+        size = 0
+        for part in parts:
+            size += sys.getsizeof(part)
+            if type(part) == list:
+                size += sum(sys.getsizeof(token) for token in part)
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0,
+            'entries': len(self.static) + len(self.dynamic),
+            'bytes': size,
+        }
@@ -0,0 +1,51 @@
+import base64
+import hashlib
+import hmac
+import os
+import time
+
+
+def urlsafe(raw):
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+class SessionTokens:
+    def __init__(self, ttl, secret=None):
+        self.ttl = ttl
+        self.secret = secret or os.urandom(32)
+
+        # Only the most recently issued token for each player is honored, so issuing a new one
+        # (or revoking) invalidates any older token without having to remember it
+        self.issued = {}
+
+    def sign(self, payload):
+        return urlsafe(hmac.new(self.secret, payload.encode('ascii'), hashlib.sha256).digest()[:18])
+
+    def issue(self, name):
+        nonce = urlsafe(os.urandom(9))
+        expiry = int(time.time()) + self.ttl
+        self.issued[name] = nonce
+
+        payload = f'{name}.{expiry}.{nonce}'
+        return f'{payload}.{self.sign(payload)}', expiry
+
+    def verify(self, token):
+        if not token.isascii():
+            return None
+
+        try:
+            name, expiry, nonce, signature = token.split('.')
+            expiry = int(expiry)
+        except ValueError:
+            return None
+
+        if not hmac.compare_digest(signature, self.sign(f'{name}.{expiry}.{nonce}')):
+            return None
+        if expiry < time.time():
+            return None
+        if not hmac.compare_digest(self.issued.get(name, ''), nonce):
+            return None
+        return name
+
+    def revoke(self, name):
+        self.issued.pop(name, None)
@@ -1,9 +1,14 @@
 from pathlib import Path
 import asyncio
 import argparse
+import sys
 
 import websockets
+from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
 
+import compiler
+import copyover
+import protocol
 from world import World
 from common import log
 from network import TelnetConnection, WebsocketConnection, websocket_handler
@@ -18,12 +23,33 @@ parser.add_argument(
     default=(script_root / 'server'),
     help='Specify a server configuration root directory'
 )
+parser.add_argument(
+    '--copyover',
+    type=Path,
+    default=None,
+    help=argparse.SUPPRESS   # Connection state handed over by a running server that is replacing itself
+)
+parser.add_argument(
+    '--compile',
+    action='store_true',
+    help='Validate every area, write a compiled world to the configuration root and exit'
+)
 args = parser.parse_args()
 
 
+if args.compile:
+    sys.exit(compiler.compile_world(args.root))
+
 World().setup(args.root)
 
 
+async def tick():
+    w = World()
+    while True:
+        await asyncio.sleep(w.config['tick_interval'])
+        w.run_guarded(w.tick)   # Anything that escapes one tick must not end the loop for good
+
+
 async def main():
     w = World()
 
@@ -35,15 +61,31 @@ async def main():
     telnet_server = await loop.create_server(lambda: TelnetConnection(), w.config['telnet_host'], w.config['telnet_port'])
     awaitables.append(telnet_server.serve_forever())
     
+    extensions = []
+    if w.config['websocket_deflate']:
+        extensions.append(ServerPerMessageDeflateFactory(
+            server_max_window_bits=w.config['websocket_deflate_window_bits'],
+            client_max_window_bits=w.config['websocket_deflate_window_bits'],
+            compress_settings={'memLevel': w.config['websocket_deflate_mem_level']},
+        ))
+
     log(f"Running websocket server on {w.config['websocket_host'] or '*'}:{w.config['websocket_port']}", 'SERVER')
     websocket_server = await websockets.serve(
         websocket_handler,
         w.config['websocket_host'],
         w.config['websocket_port'],
-        create_protocol=WebsocketConnection
+        create_protocol=WebsocketConnection,
+        subprotocols=protocol.subprotocols,
+        compression=None,
+        extensions=extensions
     )
     awaitables.append(websocket_server.serve_forever())
 
+    if args.copyover:
+        await copyover.restore(args.copyover)
+
+    awaitables.append(tick())
+
     await asyncio.gather(*awaitables)
 
 
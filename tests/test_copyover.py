@@ -0,0 +1,116 @@
+# Runs a real server on a scratch copy of server/, then checks that a copyover keeps telnet sessions and
+# their locations, and that it writes outstanding checkpoint state first
+# Run from the repository root: python -m pytest tests
+from pathlib import Path
+import shutil
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+
+repo_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(repo_root))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def scratch_root(tmp_path, config=''):
+    root = tmp_path / 'server'
+    shutil.copytree(repo_root / 'server', root, ignore=shutil.ignore_patterns('world.db', 'world.compiled', 'copyover.json'))
+    with (root / 'config.yaml').open('a') as f:
+        f.write(config)
+    return root
+
+
+class Client:
+    def __init__(self, port):
+        self.sock = socket.create_connection(('localhost', port), timeout=10)
+        self.received = b''
+
+    def read_until(self, marker, timeout=10):
+        deadline = time.time() + timeout
+        while marker.encode() not in self.received:
+            assert time.time() < deadline, f'Timed out waiting for {marker!r}, got {self.received[-500:]!r}'
+            self.sock.settimeout(max(deadline - time.time(), 0.01))
+            data = self.sock.recv(65536)
+            assert data, f'Connection closed while waiting for {marker!r}'
+            self.received += data
+        text = self.received.decode('latin1')
+        self.received = b''
+        return text
+
+    def send(self, line, marker):
+        self.sock.sendall(line.encode('ascii') + b'\r\n')
+        return self.read_until(marker)
+
+    def create_account(self, name):
+        self.read_until('Enter your name')
+        self.send('+', 'Enter the name you will use')
+        self.send(name, 'Your password')
+        self.send('password', 'Please re-enter')
+        self.send('password', '> ')
+
+
+@pytest.fixture
+def server(tmp_path):
+    port = free_port()
+    root = scratch_root(tmp_path, f'  telnet_port: {port}\n  websocket_port: {free_port()}\n  admins:\n    - Alpha\n')
+    process = subprocess.Popen([sys.executable, str(repo_root / 'sigma.py'), '--root', str(root)], cwd=tmp_path,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.time() + 15
+    while True:
+        try:
+            socket.create_connection(('localhost', port), timeout=1).close()
+            break
+        except OSError:
+            assert process.poll() is None and time.time() < deadline, 'Server did not start'
+            time.sleep(0.1)
+
+    yield port, process
+
+    process.terminate()
+    process.wait(10)
+
+
+def test_copyover_keeps_sessions(server):
+    port, process = server
+
+    alpha = Client(port)
+    alpha.create_account('Alpha')
+    bravo = Client(port)
+    bravo.create_account('Bravo')
+    assert 'Island - Shore' in bravo.send('go north', '> ')
+
+    alpha.sock.sendall(b'copyover\r\n')
+    alpha.read_until('The world settles back into place.')
+    bravo.read_until('The world settles back into place.')
+
+    # Same process id, new program image, and both players still where they were
+    assert process.poll() is None
+    assert 'Island - Shore' in bravo.send('look', 'Exits')
+    assert 'The First Room' in alpha.send('look', 'Exits')
+    assert 'Palace - Courtyard' in bravo.send('go north', 'Exits')
+
+
+def test_copyover_flushes_checkpoint(tmp_path):
+    from world import World
+
+    root = scratch_root(tmp_path, '  checkpoint_interval: 3600\n')
+    w = World()
+    w.setup(root)
+
+    # Nothing would be written before the interval, so only the flush can persist the change
+    w.doors['ravren:palace-crypt'].locked = False
+    w.checkpointer.flush()
+    assert not w.checkpointer.dirty and not w.checkpointer.pending
+
+    w.setup(root)
+    assert w.doors['ravren:palace-crypt'].locked is False
@@ -0,0 +1,58 @@
+# Round-trips frames through the binary encodings, with and without the dictionary
+# Run from the repository root: python -m pytest tests
+from pathlib import Path
+import json
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import protocol
+
+
+frames = [
+    ('game', ['{bold}', 'Welcome to ', '{cyan}', 'sigma2-mud', '{reset}', '!', '\r\n']),
+    ('game', ['Ærøskøbing café — ☃ ', '{green}', 'naïve', '']),
+    ('game', ['x' * 300]),   # A length that needs a two-byte varint
+    ('prompt', ['Enter your name (or + to create a new character): ']),
+    ('prompt', ['> ']),
+    ('state', {'state': 'welcome', 'mask': '^((\\+)|([A-Z][A-Z,a-z]*)|(resume [A-Za-z0-9_.-]+))$'}),
+    ('state', {'state': 'playing', 'mask': ''}),
+    ('token', ['Alpha.1792437632.rNUKozoiXTsq.t014b8YPcxenohATJd7QSwk1']),
+    ('data', ['Char.Status', '{"hp": 150}']),
+]
+
+
+@pytest.mark.parametrize('subprotocol', [protocol.BINARY, protocol.BINARY_DICT])
+@pytest.mark.parametrize('context, content', frames)
+def test_binary_round_trip(subprotocol, context, content):
+    assert protocol.decode_binary(protocol.encode(subprotocol, context, content)) == (context, content)
+
+
+def test_dictionary_shrinks_frames():
+    context, content = frames[0]
+    with_dictionary = protocol.encode(protocol.BINARY_DICT, context, content)
+    without_dictionary = protocol.encode(protocol.BINARY, context, content)
+    assert len(with_dictionary) < len(without_dictionary)
+
+    # Every dictionary entry goes out as a single byte reference
+    for entry in protocol.dictionary[:64]:
+        assert protocol.encode(protocol.BINARY_DICT, 'prompt', [entry]) == bytes([protocol.context_tags['prompt'], (protocol.dictionary_index[entry] << 1) | 1])
+
+
+def test_dictionary_frame_is_never_encoded_against_itself():
+    encoded = protocol.encode(protocol.BINARY_DICT, 'dictionary', list(protocol.dictionary))
+    assert protocol.decode_binary(encoded) == ('dictionary', list(protocol.dictionary))
+    assert len(encoded) > sum(len(entry) for entry in protocol.dictionary)
+
+
+def test_varint_round_trip():
+    for value in (0, 1, 127, 128, 300, 16383, 16384, 2 ** 31):
+        encoded = protocol.encode_varint(value)
+        assert protocol.decode_varint(encoded, 0) == (value, len(encoded))
+
+
+def test_json_frames():
+    context, content = frames[5]
+    assert json.loads(protocol.encode(protocol.JSON, context, content)) == {'context': context, 'content': content}
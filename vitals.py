@@ -0,0 +1,122 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from common import log
+
+
+HP_PER_LEVEL = 15
+
+
+class VitalsEngine:
+    fields = ('hp', 'max_hp', 'level', 'regen')
+    timers = ('stunned', 'poisoned')
+
+    def __init__(self, capacity=64, use_numpy=True):
+        self.use_numpy = use_numpy and numpy is not None
+        if use_numpy and not self.use_numpy:
+            log('NumPy is not available, updating vitals in pure Python', 'STARTUP', trivial=True)
+
+        self.capacity = 0
+        self.columns = {}
+        self.characters = []
+        self.free_slots = []
+        self.grow(capacity)
+
+    def grow(self, capacity):
+        for name in self.fields + self.timers:
+            if self.use_numpy:
+                column = numpy.zeros(capacity, dtype=numpy.int64)
+                if name in self.columns:
+                    column[:self.capacity] = self.columns[name]
+            else:
+                column = self.columns.get(name, []) + [0] * (capacity - self.capacity)
+            self.columns[name] = column
+
+        self.characters += [None] * (capacity - self.capacity)
+        self.free_slots += reversed(range(self.capacity, capacity))
+        self.capacity = capacity
+
+    def register(self, character):
+        if not self.free_slots:
+            self.grow(self.capacity * 2)
+
+        slot = self.free_slots.pop()
+        self.characters[slot] = character
+        for name in self.timers:
+            self.columns[name][slot] = 0
+        self.columns['hp'][slot] = character._hp
+        self.set_level(slot, character._level)
+        character.vitals_slot = slot
+
+    def release(self, character):
+        # Write the final values back before the slot is reused
+        character._hp = character.hp
+        slot = character.vitals_slot
+        character.vitals_slot = None
+
+        self.characters[slot] = None
+        self.columns['hp'][slot] = 0
+        self.columns['max_hp'][slot] = 0
+        self.columns['regen'][slot] = 0
+        self.free_slots.append(slot)
+
+    def get(self, slot, name):
+        return int(self.columns[name][slot])
+
+    def set(self, slot, name, value):
+        self.columns[name][slot] = value
+
+    def set_level(self, slot, level):
+        max_hp = level * HP_PER_LEVEL
+        self.columns['level'][slot] = level
+        self.columns['max_hp'][slot] = max_hp
+        self.columns['regen'][slot] = max(1, max_hp // 20)
+
+    def set_timer(self, character, name, ticks):
+        self.columns[name][character.vitals_slot] = ticks
+
+    def tick(self):
+        # Returns the characters whose hp changed, so callers can persist or report them
+        if self.use_numpy:
+            return self.tick_numpy()
+        else:
+            return self.tick_python()
+
+    def tick_numpy(self):
+        hp, max_hp, regen = self.columns['hp'], self.columns['max_hp'], self.columns['regen']
+        stunned, poisoned = self.columns['stunned'], self.columns['poisoned']
+
+        # Stunned characters do not recover and poison drains what would have been regenerated, but never kills
+        delta = numpy.where(stunned > 0, 0, regen) * numpy.where(poisoned > 0, -1, 1)
+        updated = numpy.minimum(numpy.maximum(hp + delta, numpy.minimum(hp, 1)), max_hp)
+
+        changed = numpy.flatnonzero(updated != hp)
+        hp[:] = updated
+        numpy.maximum(stunned - 1, 0, out=stunned)
+        numpy.maximum(poisoned - 1, 0, out=poisoned)
+
+        return [self.characters[slot] for slot in changed]
+
+    def tick_python(self):
+        hp, max_hp, regen = self.columns['hp'], self.columns['max_hp'], self.columns['regen']
+        stunned, poisoned = self.columns['stunned'], self.columns['poisoned']
+
+        changed = []
+        for slot, character in enumerate(self.characters):
+            if character is None:
+                continue
+
+            delta = 0 if stunned[slot] > 0 else regen[slot]
+            if poisoned[slot] > 0:
+                delta = -delta
+            updated = min(max(hp[slot] + delta, min(hp[slot], 1)), max_hp[slot])
+
+            if updated != hp[slot]:
+                hp[slot] = updated
+                changed.append(character)
+            stunned[slot] = max(stunned[slot] - 1, 0)
+            poisoned[slot] = max(poisoned[slot] - 1, 0)
+
+        return changed
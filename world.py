@@ -1,10 +1,21 @@
 import sqlite3
 import json
+import pickle
+import traceback
+import time
+from collections import OrderedDict, deque
 
 import yaml
 
 from character import Denizen
+from checkpoint import Checkpointer
+from combat import CombatResolver
+from render import RenderCache
 from common import log, Singleton
+from events import Event, EventBus, EventType, Trigger
+from memstat import MemoryMonitor
+from session import SessionTokens
+from vitals import VitalsEngine
 from commands.commands import register_commands
 
 directions = {
@@ -23,6 +34,10 @@ directions = {
 }
 valid_directions = directions.keys()
 
+# Column order of the exit table in a compiled world, and the layout version it was written with
+exit_directions = tuple(directions)
+compiled_format = 1
+
 
 def canonical_id(area, id, only_local=False):
     components = id.split(':', 1)
@@ -43,10 +58,29 @@ class World(metaclass=Singleton):
             'telnet_port': 4000,
             'websocket_host': None,
             'websocket_port': 4444,
+            'websocket_deflate': True,
+            'websocket_deflate_window_bits': 11,
+            'websocket_deflate_mem_level': 4,
             'welcome_message': ['{bold}', 'Welcome to ', '{cyan}', 'sigma2-mud', '{reset}', '!'],
             'default_location': 'system:start',
+            'resume_token_ttl': 900,
+            'player_cache_size': 256,
+            'tick_interval': 0.1,
+            'checkpoint_interval': 30,
+            'checkpoint_batch_size': 64,
+            'event_handler_budget': 0.005,
+            'vitals_interval_ticks': 10,
+            'vitals_use_numpy': True,
+            'combat_round_ticks': 20,
+            'wrap_width': 78,
+            'admins': [],
+            'input_queue_size': 20,
+            'commands_per_tick': 2,
+            'login_retry_delay': 2,
+            'memstat_interval': 0,
         }
         self.command_register = None
+        self.session_tokens = None
         
         self.rooms = {}
         self.doors = {}
@@ -54,12 +88,76 @@ class World(metaclass=Singleton):
         self.denizens = {}
         self.players = {}
 
+        # Every known username, plus the most recently used (data, password_hash) records
+        self.player_names = set()
+        self.player_cache = OrderedDict()
+        self.player_cache_stats = {
+            'hits': 0,
+            'misses': 0,
+            'unknown': 0,
+        }
+
         self.denizen_sources = {}
 
+        self.checkpointer = Checkpointer(self)
+
+        self.events = EventBus(self)
+        self.deferred = deque()
+
+        self.render_cache = RenderCache(self)
+        self.memstat = MemoryMonitor(self)
+
+        self.vitals = None
+        self.combat = None
+        self.tick_count = 0
+
+        # Connections with queued input, served round-robin each tick
+        self.input_ready = deque()
+
     def setup(self, config_root):
         # Setting up a world always starts from a cleanly-initialized object
         self.__init__()
 
+        self.load_config(config_root)
+
+        self.session_tokens = SessionTokens(self.config['resume_token_ttl'])
+        self.vitals = VitalsEngine(use_numpy=self.config['vitals_use_numpy'])
+        self.combat = CombatResolver(self, use_numpy=self.vitals.use_numpy)
+
+        # Initialize a persistent database if we don't have one already
+        db_file = config_root / 'world.db'
+        if not db_file.exists():
+            log('No database found, initializing a blank one', 'DATABASE')
+            con = sqlite3.connect(db_file)
+            con.cursor().execute('CREATE TABLE players (username text primary key, password_hash text, data text)')
+            con.commit()
+            con.close()
+
+        con = self.database_connection()
+        self.checkpointer.create_tables(con)
+        self.player_names = {row[0] for row in con.cursor().execute('SELECT username FROM players')}
+        con.close()
+        log(f'Indexed {len(self.player_names)} player names', 'DATABASE', trivial=True)
+
+        compiled = self.compiled_world()
+        if compiled:
+            log(f'Importing {len(compiled["rooms"])} rooms from compiled world', 'IMPORT')
+            self.load_compiled(compiled)
+        else:
+            self.load_area_files()
+
+        # Ensure the default location is available for use
+        assert self.config['default_location'] in self.rooms
+
+        # Bring mutable world state back to where the last checkpoint left it
+        self.checkpointer.restore()
+
+        # Only the manifest is read here; the modules load on the first tick, so that a reload which fails later
+        # always has the code that was running to fall back on
+        self.command_register = register_commands()
+        self.defer(self.command_register.load_all)
+
+    def load_config(self, config_root):
         self.config_root = config_root
 
         log(f'Using config root [{config_root}]', 'STARTUP')
@@ -73,18 +171,10 @@ class World(metaclass=Singleton):
                 except KeyError:
                     log('Server config file must have configuration parameters as a child of a single element named <config>', exit_code=1)
 
-        # Initialize a persistent database if we don't have one already
-        db_file = config_root / 'world.db'
-        if not db_file.exists():
-            log('No database found, initializing a blank one', 'DATABASE')
-            con = sqlite3.connect(db_file)
-            con.cursor().execute('CREATE TABLE players (username text primary key, password_hash text, data text)')
-            con.commit()
-            con.close()
-
+    def load_area_files(self):
         # Load each area file
-        for area_file in (config_root / 'areas').glob('*.yaml'):
-            log(f'Importing area from [{area_file.relative_to(config_root)}]', 'IMPORT', trivial=True)
+        for area_file in (self.config_root / 'areas').glob('*.yaml'):
+            log(f'Importing area from [{area_file.relative_to(self.config_root)}]', 'IMPORT', trivial=True)
             area = area_file.stem
             with area_file.open() as f:
                 try:
@@ -105,18 +195,77 @@ class World(metaclass=Singleton):
                     exit_.door = self.doors[exit_.door]
                 except KeyError:
                     log(f'Unable to resolve door <{exit_.door}> (from room <{room_id}>, direction <{direction}>)', exit_code=1)
-
-        # Ensure the default location is available for use
-        assert self.config['default_location'] in self.rooms
-
-        self.command_register = register_commands()
-
-    def load_area(self, area_id, name=None, rooms={}, doors={}, denizens={}):
+                exit_.door.rooms.append(room)
+
+    def compiled_world(self):
+        # A compiled world is only used while it is newer than every area file and covers exactly the same files
+        compiled_file = self.config_root / 'world.compiled'
+        if not compiled_file.exists():
+            return None
+
+        area_files = list((self.config_root / 'areas').glob('*.yaml'))
+        compiled_time = compiled_file.stat().st_mtime
+        if any(area_file.stat().st_mtime > compiled_time for area_file in area_files):
+            log('Compiled world is older than the area files, importing areas instead', 'IMPORT')
+            return None
+
+        with compiled_file.open('rb') as f:
+            compiled = pickle.load(f)
+        if compiled['format'] != compiled_format or sorted(compiled['area_files']) != sorted(area_file.name for area_file in area_files):
+            log('Compiled world does not match the area files, importing areas instead', 'IMPORT')
+            return None
+        return compiled
+
+    def load_compiled(self, compiled):
+        for area_id, name in compiled['areas'].items():
+            self.areas[area_id] = {
+                'name': name,
+                'rooms': {},
+                'doors': {},
+                'denizen_sources': {},
+                'triggers': [],
+            }
+
+        rooms = [Room(area_id, room_id, name, desc) for area_id, room_id, name, desc in compiled['rooms']]
+        doors = [Door(area_id, door_id, closed, locked) for area_id, door_id, closed, locked in compiled['doors']]
+        for room in rooms:
+            self.areas[room.area_id]['rooms'][room.canonical_id] = room
+            self.rooms[room.canonical_id] = room
+        for door in doors:
+            door_id = canonical_id(door.area_id, door.id)
+            self.areas[door.area_id]['doors'][door_id] = door
+            self.doors[door_id] = door
+
+        # Exits are already resolved: row n of the table holds room n's targets, one column per direction
+        targets, exit_doors, width = compiled['exits'], compiled['exit_doors'], len(exit_directions)
+        for number, room in enumerate(rooms):
+            for column, direction in enumerate(exit_directions):
+                target = targets[number * width + column]
+                if target < 0:
+                    continue
+                exit_ = room.exits[direction] = Exit(room.area_id, room.id, direction, target=rooms[target].canonical_id)
+                exit_.target = rooms[target]
+                door = exit_doors[number * width + column]
+                if door >= 0:
+                    exit_.door = doors[door]
+                    exit_.door.rooms.append(room)
+
+        for source_id, source in compiled['denizen_sources'].items():
+            self.areas[source[0]]['denizen_sources'][source_id] = source
+            self.denizen_sources[source_id] = source
+
+        for area_id, index, trigger in compiled['triggers']:
+            trigger = Trigger(area_id, index, **trigger)
+            self.areas[area_id]['triggers'].append(trigger)
+            self.subscribe_trigger(trigger)
+
+    def load_area(self, area_id, name=None, rooms={}, doors={}, denizens={}, triggers=[]):
         area = {
             'name': name or area_id,
             'rooms': {},
             'doors': {},
             'denizen_sources': {},
+            'triggers': [],
         }
 
         for room_id, room in rooms.items():
@@ -137,30 +286,165 @@ class World(metaclass=Singleton):
             except TypeError as e:
                 log(str(e), exit_code=1)
 
+        for index, trigger in enumerate(triggers):
+            try:
+                area['triggers'].append(Trigger(area_id, index, **trigger))
+            except TypeError as e:
+                log(str(e), exit_code=1)
+
         self.areas[area_id] = area
         self.rooms.update(area['rooms'])
         self.doors.update(area['doors'])
         self.denizen_sources.update(area['denizen_sources'])
 
+        for trigger in area['triggers']:
+            self.subscribe_trigger(trigger)
+
+    def subscribe_trigger(self, trigger):
+        self.events.subscribe(
+            trigger.event_type,
+            trigger,
+            room=canonical_id(trigger.area_id, trigger.room) if trigger.scope == 'room' else None,
+            area=trigger.area_id if trigger.scope == 'area' else None
+        )
+
+    def tick(self):
+        self.tick_count += 1
+
+        self.process_input()
+
+        if self.tick_count % self.config['combat_round_ticks'] == 0:
+            self.combat.resolve()
+
+        if self.tick_count % self.config['vitals_interval_ticks'] == 0:
+            for character in self.vitals.tick():
+                if character.id in self.denizens:
+                    self.checkpointer.mark_dirty(character)
+
+        # Coalesce each player's status changes since the last tick into a single update
+        for player in self.players.values():
+            player.flush_status()
+
+        self.run_guarded(self.checkpointer.step)
+        self.run_guarded(self.memstat.step)
+
+        # Run work deferred since the last tick, but not anything it defers in turn
+        for _ in range(len(self.deferred)):
+            callback, args = self.deferred.popleft()
+            self.run_guarded(callback, *args)
+
+    def run_guarded(self, callback, *args):
+        # Area scripts and the database can fail at any time, but that must not stop the tick
+        try:
+            callback(*args)
+        except Exception:
+            log(f'Error running {callback}:\r\n{traceback.format_exc()}', 'ERROR')
+
+    def process_input(self):
+        # One line per connection per round, so a flood from one client only delays that client
+        now = time.time()
+        for _ in range(self.config['commands_per_tick']):
+            for _ in range(len(self.input_ready)):
+                connection = self.input_ready.popleft()
+                if not connection.input_queue:
+                    continue   # Closed since it was queued
+                if connection.input_held_until > now:
+                    self.input_ready.append(connection)
+                    continue
+
+                line = connection.input_queue.popleft()
+                try:
+                    connection.process(line)
+                except Exception:
+                    log(f'Error processing "{line}" from {connection.peername}:\r\n{traceback.format_exc()}', 'ERROR')
+                    connection.write_line('- Something went wrong.')
+
+                if connection.input_dropped:
+                    log(f'Dropped {connection.input_dropped} queued lines from {connection.peername}', 'CLIENT', trivial=True)
+                    connection.write_line(f'- You are sending commands too quickly; {connection.input_dropped} were ignored.')
+                    connection.input_dropped = 0
+
+                if connection.input_queue:
+                    self.input_ready.append(connection)
+
+    def defer(self, callback, *args):
+        self.deferred.append((callback, args))
+
+    def spawn_denizen(self, source_id, location=None, uuid=None, stats=None):
+        area_id, denizen_id, denizen = self.denizen_sources[source_id]
+        if stats is not None:
+            denizen = dict(denizen, stats=stats)
+
+        if location not in self.rooms:
+            location = None   # Falls back to the default location
+
+        denizen = Denizen(area_id, denizen_id, location=location, uuid=uuid, **denizen)
+        self.denizens[denizen.id] = denizen
+        self.vitals.register(denizen)
+        self.rooms[denizen.location].add_character(denizen)
+        self.checkpointer.mark_dirty(denizen)
+        return denizen
+
+    def remove_denizen(self, denizen):
+        if self.denizens.pop(denizen.id, None):
+            self.rooms[denizen.location].remove_character(denizen)
+            self.vitals.release(denizen)
+            self.checkpointer.mark_removed(denizen)
+
+    def move_character(self, character, destination, direction=None):
+        origin = self.rooms[character.location]
+        origin.remove_character(character)
+        self.events.publish(Event(EventType.LEAVE, origin, character, direction=direction))
+
+        character.location = destination.canonical_id
+        destination.add_character(character)
+        if character.id in self.denizens:
+            self.checkpointer.mark_dirty(character)
+        self.events.publish(Event(EventType.ENTER, destination, character, direction=direction))
+
     def insert_player(self, player):
         if player.id in self.players:
             return False
         
+        # A saved location may refer to a room that has since been removed
+        if player.location not in self.rooms:
+            player.location = self.config['default_location']
+
         self.players[player.id] = player
+        self.vitals.register(player)
+        self.rooms[player.location].add_character(player)
 
         log(f'Successful login: <{player.name}> from {player.connection.peername}', 'LOGIN')
-        # TODO: Add to room
+        self.events.publish(Event(EventType.LOGIN, self.rooms[player.location], player))
         return True
 
     def remove_player(self, player):
         if player.id in self.players and self.players[player.id] == player:
             log(f'Logout: <{player.name}> from {player.connection.peername}', 'LOGOUT')
             del self.players[player.id]
+            self.vitals.release(player)
+            self.rooms[player.location].remove_character(player)
+            self.events.publish(Event(EventType.LOGOUT, self.rooms[player.location], player))
 
     def database_connection(self):
         return sqlite3.connect(self.config_root / 'world.db')
 
+    def player_exists(self, name):
+        return name in self.player_names
+
     def retrieve_player_data(self, name):
+        # Unknown names are answered from the in-memory index without touching the database
+        if name not in self.player_names:
+            self.player_cache_stats['unknown'] += 1
+            return None, None, None
+
+        if name in self.player_cache:
+            self.player_cache_stats['hits'] += 1
+            self.player_cache.move_to_end(name)
+            data, password_hash = self.player_cache[name]
+            return json.loads(data), name, password_hash
+
+        self.player_cache_stats['misses'] += 1
         con = self.database_connection()
         result = con.cursor().execute('SELECT data, password_hash FROM players WHERE username = ?', (name, )).fetchone()
         con.close()
@@ -168,23 +452,46 @@ class World(metaclass=Singleton):
         if not result:
             return None, None, None
         else:
+            self.cache_player_record(name, *result)
             return json.loads(result[0]), name, result[1]
 
+    def cache_player_record(self, name, data, password_hash):
+        self.player_cache[name] = (data, password_hash)
+        self.player_cache.move_to_end(name)
+        while len(self.player_cache) > self.config['player_cache_size']:
+            self.player_cache.popitem(last=False)
+
     def save_player_data(self, player):
+        data = json.dumps(player.to_proto())
+
         con = self.database_connection()
         result = con.cursor().execute('''
             INSERT INTO players (username, data) VALUES (?, ?)
             ON CONFLICT (username) DO UPDATE SET data=excluded.data
-        ''', (player.name, json.dumps(player.to_proto())))
+        ''', (player.name, data))
         con.commit()
         con.close()
 
+        self.player_names.add(player.name)
+        if player.name in self.player_cache:
+            self.cache_player_record(player.name, data, self.player_cache[player.name][1])
+
     def update_player_password(self, player, password_hash):
+        # Any outstanding resume token was granted under the old password
+        self.session_tokens.revoke(player.name)
+
         con = self.database_connection()
         result = con.cursor().execute('UPDATE players SET password_hash=? WHERE username = ?', (password_hash, player.name))
         con.commit()
         con.close()
 
+        if player.name in self.player_cache:
+            self.cache_player_record(player.name, self.player_cache[player.name][0], password_hash)
+
+
+def keyword_prefixes(character):
+    return {keyword.lower()[:i] for keyword in character.keywords for i in range(1, len(keyword) + 1)}
+
 
 class Room:
     def __init__(self, area_id, room_id, name=None, desc=None, exits={}):
@@ -193,10 +500,19 @@ class Room:
 
         self.id = room_id
         self.area_id = area_id
+        self.canonical_id = canonical_id(area_id, room_id)
         self.name = name
         self.desc = desc
         self.exits = {}
 
+        # Occupants in order of arrival, and every keyword (and every prefix of one) mapped to matching occupants in
+        # the same order; dicts rather than lists so that leaving costs the same however crowded the room is
+        self.characters = {}
+        self.keyword_index = {}
+
+        # Bumped whenever occupancy or the state of a door out of here changes
+        self.version = 0
+
         for direction, exit_ in exits.items():
             if not direction in valid_directions:
                 log(f'Area <{area_id}>: Room <{room_id}>: Invalid exit direction: {direction}', exit_code=1)
@@ -210,6 +526,35 @@ class Room:
                 self.exits[direction] = Exit(area_id, room_id, direction, target=canonical_id(area_id, exit_))
 
 
+    def add_character(self, character):
+        self.characters[character] = None
+        for prefix in keyword_prefixes(character):
+            self.keyword_index.setdefault(prefix, {})[character] = None
+        self.version += 1
+
+    def remove_character(self, character):
+        del self.characters[character]
+        for prefix in keyword_prefixes(character):
+            matches = self.keyword_index[prefix]
+            del matches[character]
+            if not matches:
+                del self.keyword_index[prefix]
+        self.version += 1
+
+    def find_character(self, keyword, ordinal=1, exclude=None):
+        # Usually called with the speaker excluded, so they never count towards the ordinal or match themselves
+        matches = self.keyword_index.get(keyword.lower(), {})
+        if not 0 < ordinal <= len(matches) - (exclude in matches):
+            return None
+
+        # Ordinals are small, so walking to the nth match (stepping over the excluded one) costs next to nothing
+        for character in matches:
+            if character is not exclude:
+                ordinal -= 1
+                if not ordinal:
+                    return character
+
+
 class Exit:
     def __init__(self, area_id, room_id, direction, target=None, door=None):
         if not target:
@@ -227,5 +572,21 @@ class Door:
     def __init__(self, area_id, door_id, closed=True, locked=False):
         self.id = door_id
         self.area_id = area_id
-        self.closed = closed
-        self.locked = locked
+        self._closed = closed
+        self._locked = locked
+        self.rooms = []
+
+    checkpoint_key = property(lambda self: ('door', f'{self.area_id}:{self.id}'))
+
+    def _set_closed(self, closed):
+        self._closed = closed
+        for room in self.rooms:
+            room.version += 1
+        World().checkpointer.mark_dirty(self)
+
+    def _set_locked(self, locked):
+        self._locked = locked
+        World().checkpointer.mark_dirty(self)
+
+    closed = property(lambda self: self._closed, _set_closed)
+    locked = property(lambda self: self._locked, _set_locked)